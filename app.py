@@ -1,16 +1,10 @@
+import time
+
 import streamlit as st
-import requests
-import pandas as pd
-import matplotlib.pyplot as plt
-from bs4 import BeautifulSoup
-from wordcloud import WordCloud
-from nltk.sentiment import SentimentIntensityAnalyzer
-import nltk
-import re
-import random
-
-nltk.download("vader_lexicon", quiet=True)
-sia = SentimentIntensityAnalyzer()
+
+# Heavy libraries (requests, bs4, pandas, wordcloud) are imported
+# inside the tab that uses them, so other tabs never pay for them.
+# Analyses themselves run as jobs in worker processes (see jobs.py).
 
 # Apply enhanced CSS with better colors and graphics
 def apply_enhanced_design():
@@ -173,18 +167,44 @@ apply_enhanced_design()
 # Page configuration
 st.set_page_config(page_title="Bakery Analyzer", layout="centered", page_icon="🍞")
 
-# Generate some random metrics for the UI
-def generate_random_metrics():
-    return {
-        "total_bakeries": random.randint(500, 1500),
-        "avg_rating": round(random.uniform(3.8, 4.9), 1),
-        "reviews_analyzed": random.randint(10000, 50000),
-        "products_tracked": random.randint(2000, 8000)
-    }
+# Submissions and header counters on disk, shared by every session
+@st.cache_resource
+def load_submission_store():
+    from submissions import SubmissionStore
+    
+    return SubmissionStore()
+
+# Industry percentile sketches on disk, shared by every session
+@st.cache_resource
+def load_percentile_store():
+    from percentiles import PercentileStore
+    
+    return PercentileStore()
+
+# Analyses run as background jobs in worker processes, shared by every session
+@st.cache_resource
+def load_job_manager():
+    from jobs import JobManager
+    
+    return JobManager()
+
+# Parsed CSV uploads, shared by reruns and sessions
+@st.cache_resource
+def load_upload_cache():
+    from upload_cache import UploadCache
+    
+    return UploadCache()
+
+# Memory-mapped term indexes of recently viewed CSV jobs
+@st.cache_resource(max_entries=8)
+def load_term_index(path):
+    from term_index import TermIndex
+    
+    return TermIndex(path)
 
 # Display scattered metrics
 def display_scattered_metrics():
-    metrics = generate_random_metrics()
+    metrics = load_submission_store().header_metrics()
     
     col1, col2, col3, col4 = st.columns(4)
     
@@ -220,6 +240,400 @@ def display_scattered_metrics():
         </div>
         """, unsafe_allow_html=True)
 
+# HTML for one scattered metric card
+def metric_card(value, label):
+    return f"""
+    <div class="scattered-metric">
+        <h3 style="margin: 0; font-size: 1.8rem;">{value}</h3>
+        <p style="margin: 0; font-size: 0.9rem;">{label}</p>
+    </div>
+    """
+
+# Results panel for an analyzed page or crawled site
+def display_website_results(result):
+    term_counts = result["term_counts"]
+    sentiment = result["sentiment"]
+    health_score = result["health_score"]
+    
+    # Display scattered metrics for this analysis
+    col1, col2, col3 = st.columns(3)
+    col1.markdown(metric_card(result["words"], "Words Analyzed"), unsafe_allow_html=True)
+    col2.markdown(metric_card(sum(term_counts.values()), "Bakery Terms"), unsafe_allow_html=True)
+    col3.markdown(metric_card(health_score, "Content Score"), unsafe_allow_html=True)
+    
+    # Display results in a clean layout
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        st.subheader("Content Analysis")
+        
+        if term_counts:
+            for category, count in term_counts.items():
+                st.markdown(f"""
+                <div class="metric-box">
+                    <h3 style="margin: 0; color: #E64A19;">{count}</h3>
+                    <p style="margin: 0; font-weight: 600;">{category}</p>
+                </div>
+                """, unsafe_allow_html=True)
+        else:
+            st.info("Limited bakery content detected.")
+    
+    with col2:
+        st.subheader("Sentiment Analysis")
+        
+        # Simple sentiment metrics
+        st.metric("Positive", f"{sentiment['pos']*100:.1f}%")
+        st.metric("Neutral", f"{sentiment['neu']*100:.1f}%")
+        st.metric("Negative", f"{sentiment['neg']*100:.1f}%")
+        
+        # Health score
+        st.subheader("Content Quality Score")
+        if health_score >= 70:
+            st.success(f"{health_score}/100")
+        elif health_score >= 40:
+            st.warning(f"{health_score}/100")
+        else:
+            st.error(f"{health_score}/100")
+        st.progress(health_score/100)
+    
+    # Simple recommendations
+    st.subheader("Recommendations")
+    if health_score >= 70:
+        st.success("Your website has excellent bakery content. Keep up the good work!")
+    elif health_score >= 40:
+        st.info("Good content. Consider adding more product details and customer testimonials.")
+    else:
+        st.warning("Your website needs more bakery-specific content. Add product descriptions, about section, and customer reviews.")
+
+# Results panel for an analyzed feedback column
+def display_feedback_results(result):
+    sentiment = result["sentiment"]
+    frequencies = result["frequencies"]
+    health_score = sentiment["satisfaction"]
+    
+    hits, lookups = result["cache"]["hits"], result["cache"]["lookups"]
+    st.caption(f"Sentiment cache hit rate: {hits / lookups if lookups else 0:.0%} "
+               f"({hits} of {lookups} reviews reused from earlier uploads)")
+    
+    # Display scattered metrics for the analysis
+    duplicates = result.get("duplicates")
+    cols = st.columns(4 if duplicates else 3)
+    cols[0].markdown(metric_card(result["words"], "Words Analyzed"), unsafe_allow_html=True)
+    cols[1].markdown(metric_card(health_score, "Satisfaction Score"), unsafe_allow_html=True)
+    cols[2].markdown(metric_card(sentiment["positive_reviews"], "Positive Reviews"), unsafe_allow_html=True)
+    if duplicates:
+        cols[3].markdown(metric_card(duplicates["exact"] + duplicates["near"], "Duplicates Skipped"),
+                         unsafe_allow_html=True)
+        st.caption(f"{result['reviews']:,} distinct reviews scored; left out {duplicates['exact']:,} exact and "
+                   f"{duplicates['near']:,} near duplicates (similarity ≥ {duplicates['threshold']:.2f}).")
+    
+    # Display results
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        st.subheader("Sentiment Analysis")
+        st.metric("Positive", f"{sentiment['pos']*100:.1f}%")
+        st.metric("Neutral", f"{sentiment['neu']*100:.1f}%")
+        st.metric("Negative", f"{sentiment['neg']*100:.1f}%")
+        
+        st.subheader("Satisfaction Score")
+        if health_score >= 70:
+            st.success(f"{health_score}/100")
+        elif health_score >= 40:
+            st.warning(f"{health_score}/100")
+        else:
+            st.error(f"{health_score}/100")
+        st.progress(health_score/100)
+    
+    with col2:
+        st.subheader("Word Cloud")
+        if frequencies:
+            from terms import wordcloud_png
+            
+            st.image(wordcloud_png(frequencies))
+        else:
+            st.info("Not enough words for a word cloud.")
+    
+    # Simple insights
+    st.subheader("Insights")
+    if health_score >= 70:
+        st.success("Customers are very satisfied with your bakery!")
+    elif health_score >= 40:
+        st.info("Moderate customer satisfaction. Some areas need improvement.")
+    else:
+        st.warning("Low customer satisfaction. Immediate attention needed.")
+
+# Per-stage timings of a finished job (only when it was recorded)
+def display_performance(performance):
+    if performance is None:
+        return
+    
+    MB = 1024 * 1024
+    with st.expander("Performance", expanded=True):
+        st.caption(f"Total {performance['wall_s']:.2f} s. Stages can nest (score cache lookups run inside sentiment "
+                   "scoring), and sentiment scored in worker processes shows wall time but no CPU time here.")
+        st.dataframe([{
+            "Stage": s["stage"],
+            "Calls": s["calls"],
+            "Wall (s)": round(s["wall_s"], 3),
+            "CPU (s)": round(s["cpu_s"], 3),
+            "Input": f"{s['input']:,} {s['unit']}",
+            "Throughput (/s)": f"{s['input'] / s['wall_s']:,.0f}" if s["wall_s"] else "",
+            "RSS growth (MB)": round(s["rss_growth_bytes"] / MB, 1),
+            "Peak alloc (MB)": None if s["peak_alloc_bytes"] is None else round(s["peak_alloc_bytes"] / MB, 1),
+        } for s in performance["stages"]], hide_index=True)
+
+# Downloads the PDF report of a result; it is only written once clicked, and
+# reports.py keeps it on disk for later clicks and other sessions
+def report_download(result, file_name, key):
+    def pdf():
+        from reports import report_file
+        
+        with open(report_file(result), "rb") as fh:
+            return fh.read()
+    
+    st.download_button("Download PDF report", data=pdf, file_name=file_name, mime="application/pdf",
+                       on_click="ignore", key=key, icon="📄")
+
+# Result of a single-page website job
+def display_page_job(result):
+    from reports import report_names
+    
+    if result["source"] != "network":
+        st.caption("Page unchanged since the last analysis — using cached results.")
+    report_download(result, report_names([result])[0], "report-page")
+    display_website_results(result)
+
+# Result of a crawl job: one row per site, then each site's pages
+def display_crawl_results(result):
+    import pandas as pd
+    
+    reports = result["reports"]
+    st.subheader("Site Report")
+    st.dataframe(pd.DataFrame([{
+        "Site": r["site"],
+        "Pages": r["pages"],
+        "Errors": r["errors"],
+        "Words": r["words"],
+        **r["term_counts"],
+        "Content Score": r["health_score"],
+    } for r in reports]).fillna(0), hide_index=True)
+    
+    from reports import report_names
+    
+    for report, file_name in zip(reports, report_names(reports)):
+        with st.expander(f"{report['site']} — {report['pages']} pages"):
+            if report["pages"]:
+                report_download(report, file_name, f"report-{file_name}")
+                display_website_results(report)
+            st.dataframe(pd.DataFrame([{
+                "URL": p["url"],
+                "Depth": p["depth"],
+                "Words": p.get("words", 0),
+                "Content Score": p.get("health_score"),
+                "Source": p.get("source", ""),
+                "Error": p.get("error", ""),
+            } for p in report["page_results"]]), hide_index=True)
+
+# Result of a CSV job
+def display_csv_job(result):
+    st.caption(f"{result['file']}: {result['rows']:,} rows, {result['columns']} columns, "
+               f"{result['missing']:,} missing reviews")
+    if result["reviews"]:
+        from reports import report_names
+        
+        report_download(result, report_names([result])[0], "report-csv")
+    estimate = result.get("estimate")
+    if estimate and not estimate["exact"]:
+        display_estimate(result)
+        if result["frequencies"]:
+            from terms import wordcloud_png
+            
+            st.subheader("Word Cloud")
+            st.image(wordcloud_png(result["frequencies"]))
+            st.caption("Words of the sampled reviews.")
+        return
+    if estimate:
+        st.caption("Every review was scored, so the progressive estimate has reached the exact result.")
+    display_feedback_results(result)
+    if result.get("benchmark"):
+        st.info("📈 " + result["benchmark"])
+    if result.get("trend"):
+        display_trend(result["trend"])
+    if result.get("index"):
+        display_drilldown(result["index"])
+
+# Metrics of a progressive analysis so far, with their confidence intervals
+def display_estimate(result):
+    estimate = result["estimate"]
+    sentiment = result["sentiment"]
+    margins = estimate["margins"]
+    
+    def share(value, field):
+        margin = margins[field]
+        return f"{value * 100:.1f}%" + ("" if margin is None else f" ± {margin * 100:.1f}")
+    
+    st.caption(f"Estimated from {estimate['sampled']:,} of {estimate['population']:,} reviews "
+               f"({estimate['sampled'] / max(estimate['population'], 1):.1%}), picked at random. "
+               f"± gives the {estimate['confidence']:.0%} confidence interval for the whole file.")
+    col1, col2, col3 = st.columns(3)
+    satisfaction = f"{sentiment['pos'] * 100:.1f}"
+    if margins["pos"] is not None:
+        satisfaction += f" ± {margins['pos'] * 100:.1f}"
+    col1.metric("Satisfaction Score", satisfaction)
+    col2.metric("Positive-Review Rate", share(estimate["positive_share"], "positive_share"),
+                f"≈ {estimate['positive_share'] * estimate['population']:,.0f} reviews", delta_color="off")
+    col3.metric("Average Compound", f"{sentiment['compound']:.3f}" + (
+        "" if margins["compound"] is None else f" ± {margins['compound']:.3f}"))
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Positive", share(sentiment["pos"], "pos"))
+    col2.metric("Neutral", share(sentiment["neu"], "neu"))
+    col3.metric("Negative", share(sentiment["neg"], "neg"))
+
+# Running totals of a streaming analysis, over the rows read so far
+def display_partial(result):
+    sentiment = result["sentiment"]
+    st.caption(f"So far: {result['rows']:,} rows read, {result['missing']:,} missing reviews, "
+               f"{sentiment['reviews']:,} reviews scored.")
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Satisfaction Score", sentiment["satisfaction"])
+    col2.metric("Positive", f"{sentiment['pos']*100:.1f}%")
+    col3.metric("Neutral", f"{sentiment['neu']*100:.1f}%")
+    col4.metric("Negative", f"{sentiment['neg']*100:.1f}%")
+    if result["frequencies"]:
+        st.caption("Most frequent words so far: " + ", ".join(
+            f"{word} ({count:,})" for word, count in result["frequencies"].items()))
+
+# Reviews and sentiment for chosen products or terms, answered from the job's term index
+def display_drilldown(index_info):
+    import os
+    
+    from keywords import get_matcher
+    from term_index import SAMPLE_REVIEWS
+    from terms import indexable
+    
+    st.subheader("Drill Down")
+    if not os.path.isdir(index_info["path"]):
+        st.info("The term index of this analysis has been cleared. Run the analysis again to drill down.")
+        return
+    index = load_term_index(index_info["path"])
+    
+    products = sorted({canonical for targets in get_matcher().terms.values() for _, canonical in targets
+                       if indexable(canonical)})
+    options = products + [word for word in index.top_words() if word not in products]
+    col1, col2 = st.columns([3, 1])
+    terms = col1.multiselect("Products or terms", options, accept_new_options=True,
+                             placeholder="Pick a product or type any word")
+    match_all = col2.radio("Match", ["All terms", "Any term"], horizontal=True) == "All terms"
+    if not terms:
+        st.caption(f"{index_info['reviews']:,} reviews indexed under {index_info['terms']:,} words.")
+        return
+    
+    start = time.perf_counter()
+    ids = index.query(terms, match_all)
+    summary = index.summary(ids)
+    elapsed = time.perf_counter() - start
+    
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Matching reviews", f"{len(ids):,}",
+                f"{len(ids) / index.reviews:.1%} of all" if index.reviews else None, delta_color="off")
+    col2.metric("Positive", f"{summary['pos']*100:.1f}%")
+    col3.metric("Neutral", f"{summary['neu']*100:.1f}%")
+    col4.metric("Negative", f"{summary['neg']*100:.1f}%")
+    if len(ids):
+        st.progress(summary["satisfaction"] / 100, text=f"Satisfaction {summary['satisfaction']}/100")
+        st.dataframe(index.sample(ids), hide_index=True, column_config={
+            "row": "Row", "review": "Review", "compound": st.column_config.NumberColumn("Compound", format="%.2f")})
+    st.caption(f"Answered in {elapsed * 1000:.1f} ms; showing up to {SAMPLE_REVIEWS} matches, most negative first.")
+
+# Sentiment over time, bucketed and smoothed from the job's per-day sums
+def display_trend(trend):
+    from trends import BUCKETS, TrendAggregates, bucketed
+    
+    st.subheader("Sentiment Trend")
+    aggregates = TrendAggregates.from_dict(trend)
+    if aggregates.days.empty:
+        st.info(f"No dates could be read from the '{trend['date_column']}' column.")
+        return
+    
+    col1, col2 = st.columns(2)
+    bucket = col1.radio("Bucket", list(BUCKETS), index=1, horizontal=True)
+    window = col2.slider("Rolling average (buckets)", min_value=1, max_value=12, value=4)
+    table = bucketed(aggregates, bucket, window)
+    st.line_chart(table[["satisfaction", "satisfaction_rolling"]].rename(columns={
+        "satisfaction": "Satisfaction", "satisfaction_rolling": f"{window}-{bucket.lower()} average"}))
+    st.bar_chart(table["reviews"].rename("Reviews"), height=150)
+    
+    notes = []
+    if trend["undated"]:
+        notes.append(f"{trend['undated']:,} reviews without a readable date are left out")
+    if trend["reused_rows"]:
+        notes.append(f"{trend['reused_rows']:,} rows reused from an earlier upload of this file")
+    if notes:
+        st.caption("; ".join(notes).capitalize() + ".")
+
+# The job shown in this browser tab. Its id is kept in the URL, so reruns and
+# page reloads reattach to it.
+def current_job(kinds):
+    job_id = st.query_params.get("job")
+    job = load_job_manager().get(job_id) if job_id else None
+    return job if job is not None and job["kind"] in kinds else None
+
+# Live progress of a running job; reruns the whole app once it has finished
+@st.fragment(run_every=1.0)
+def job_progress(job_id):
+    from jobs import ACTIVE
+    
+    job = load_job_manager().get(job_id)
+    if job["status"] not in ACTIVE:
+        st.rerun()
+    st.progress(job["progress"], text=job["message"] or "Waiting for a free worker...")
+    progressive = job["params"].get("progressive")
+    if st.button("Stop here" if progressive else "Cancel", key=f"cancel-{job_id}"):
+        load_job_manager().cancel(job_id)
+    if job["result"] is None:
+        return
+    if progressive:
+        display_estimate(job["result"])
+    elif job["result"].get("partial"):
+        display_partial(job["result"])
+
+# Progress, result or error of a job; `render` draws a finished job's result
+def display_job(job, render):
+    from jobs import ACTIVE
+    
+    if job["status"] in ACTIVE:
+        st.caption(f"Analyzing {job['label']} in the background. Changing settings or reloading the page will not stop it.")
+        job_progress(job["id"])
+    elif job["status"] == "done":
+        render(job["result"])
+        display_performance(job["result"].get("performance"))
+    elif job["status"] == "failed":
+        st.error(f"Could not analyze {job['label']}: {job['error']}")
+    elif job["result"] is not None and job["result"].get("partial"):
+        st.warning(f"Analysis of {job['label']} was cancelled after {job['result']['rows']:,} rows.")
+        display_partial(job["result"])
+    elif job["result"] is not None:
+        # A progressive analysis stopped early keeps its latest estimate
+        st.info(f"Analysis of {job['label']} was stopped early.")
+        render(job["result"])
+    else:
+        st.warning(f"Analysis of {job['label']} was cancelled.")
+
+# Reattach to an earlier analysis of this tab, from any session
+def recent_jobs(kinds):
+    jobs = load_job_manager().recent(kinds)
+    if not jobs:
+        return
+    
+    with st.expander("Recent analyses"):
+        labels = {j["id"]: f"{time.strftime('%d %b %H:%M', time.localtime(j['created']))} · {j['label']} · {j['status']}"
+                  for j in jobs}
+        choice = st.selectbox("Analysis", list(labels), format_func=labels.get, label_visibility="collapsed")
+        if st.button("Open", key=f"open-{kinds[0]}"):
+            st.query_params["job"] = choice
+            st.rerun()
+
 # Enhanced header section
 st.markdown("""
 <div class="header">
@@ -237,119 +651,45 @@ option = st.radio("Choose analysis type:",
                  horizontal=True,
                  label_visibility="collapsed")
 
+if option != "Upload Data":
+    col1, col2 = st.columns(2)
+    show_performance = col1.toggle("Performance details", help="Time each analysis stage and show where the time went.")
+    trace_memory = show_performance and col2.checkbox(
+        "Trace memory allocations", help="Exact peak allocations per stage; makes the analysis several times slower.")
+    profile = {"profile": show_performance, "trace_memory": trace_memory}
+
 # Website Analysis Section
 if option == "Website Analysis":
     st.markdown('<div class="card">', unsafe_allow_html=True)
     st.markdown("### 🌐 Website Analysis")
     
-    url = st.text_input("Enter bakery website URL:", "https://www.example.com")
+    mode = st.radio("Scope:", ["Single page", "Crawl sites"], horizontal=True)
     
-    if st.button("Analyze Website", type="primary"):
-        with st.spinner("Analyzing website content..."):
-            try:
-                headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'}
-                response = requests.get(url, timeout=10, headers=headers)
-                soup = BeautifulSoup(response.content, 'html.parser')
-                
-                # Remove unnecessary elements
-                for element in soup(["script", "style", "meta", "link"]):
-                    element.decompose()
-                
-                # Extract text
-                all_text = soup.get_text(separator=' ', strip=True)
-                
-                # Simple bakery content analysis
-                bakery_terms = {
-                    'Bakery Products': ['bread', 'cake', 'pastry', 'cookie', 'pie', 'muffin', 'donut'],
-                    'Business Info': ['about', 'contact', 'hours', 'location', 'menu', 'order'],
-                    'Quality Terms': ['fresh', 'organic', 'homemade', 'artisan', 'quality', 'delicious']
-                }
-                
-                term_counts = {}
-                text_lower = all_text.lower()
-                
-                for category, terms in bakery_terms.items():
-                    count = sum(text_lower.count(term) for term in terms)
-                    if count > 0:
-                        term_counts[category] = count
-                
-                # Sentiment analysis
-                sentiment = sia.polarity_scores(all_text)
-                health_score = int(sentiment["pos"] * 100)
-                
-                # Display scattered metrics for this analysis
-                col1, col2, col3 = st.columns(3)
-                
-                with col1:
-                    st.markdown(f"""
-                    <div class="scattered-metric">
-                        <h3 style="margin: 0; font-size: 1.8rem;">{len(all_text.split())}</h3>
-                        <p style="margin: 0; font-size: 0.9rem;">Words Analyzed</p>
-                    </div>
-                    """, unsafe_allow_html=True)
-                
-                with col2:
-                    st.markdown(f"""
-                    <div class="scattered-metric">
-                        <h3 style="margin: 0; font-size: 1.8rem;">{sum(term_counts.values())}</h3>
-                        <p style="margin: 0; font-size: 0.9rem;">Bakery Terms</p>
-                    </div>
-                    """, unsafe_allow_html=True)
-                
-                with col3:
-                    st.markdown(f"""
-                    <div class="scattered-metric">
-                        <h3 style="margin: 0; font-size: 1.8rem;">{health_score}</h3>
-                        <p style="margin: 0; font-size: 0.9rem;">Content Score</p>
-                    </div>
-                    """, unsafe_allow_html=True)
-                
-                # Display results in a clean layout
-                col1, col2 = st.columns(2)
-                
-                with col1:
-                    st.subheader("Content Analysis")
-                    
-                    if term_counts:
-                        for category, count in term_counts.items():
-                            st.markdown(f"""
-                            <div class="metric-box">
-                                <h3 style="margin: 0; color: #E64A19;">{count}</h3>
-                                <p style="margin: 0; font-weight: 600;">{category}</p>
-                            </div>
-                            """, unsafe_allow_html=True)
-                    else:
-                        st.info("Limited bakery content detected.")
-                
-                with col2:
-                    st.subheader("Sentiment Analysis")
-                    
-                    # Simple sentiment metrics
-                    st.metric("Positive", f"{sentiment['pos']*100:.1f}%")
-                    st.metric("Neutral", f"{sentiment['neu']*100:.1f}%")
-                    st.metric("Negative", f"{sentiment['neg']*100:.1f}%")
-                    
-                    # Health score
-                    st.subheader("Content Quality Score")
-                    if health_score >= 70:
-                        st.success(f"{health_score}/100")
-                    elif health_score >= 40:
-                        st.warning(f"{health_score}/100")
-                    else:
-                        st.error(f"{health_score}/100")
-                    st.progress(health_score/100)
-                
-                # Simple recommendations
-                st.subheader("Recommendations")
-                if health_score >= 70:
-                    st.success("Your website has excellent bakery content. Keep up the good work!")
-                elif health_score >= 40:
-                    st.info("Good content. Consider adding more product details and customer testimonials.")
-                else:
-                    st.warning("Your website needs more bakery-specific content. Add product descriptions, about section, and customer reviews.")
-            
-            except Exception as e:
-                st.error(f"Could not analyze website: {str(e)}")
+    if mode == "Single page":
+        url = st.text_input("Enter bakery website URL:", "https://www.example.com")
+        
+        if st.button("Analyze Website", type="primary"):
+            st.query_params["job"] = load_job_manager().submit("website", url, {"url": url, **profile})
+    
+    else:
+        urls = st.text_area("Bakery websites (one URL per line):", "https://www.example.com")
+        col1, col2 = st.columns(2)
+        with col1:
+            depth = st.number_input("Link depth", min_value=0, max_value=5, value=1,
+                                    help="0 analyzes only the listed pages; 1 also follows their same-site links, and so on.")
+        with col2:
+            max_pages = st.number_input("Max pages per site", min_value=1, max_value=500, value=25)
+        
+        if st.button("Crawl Websites", type="primary"):
+            sites = [u for u in urls.splitlines() if u.strip()]
+            label = f"{sites[0]} (crawl)" if len(sites) == 1 else f"{len(sites)} sites (crawl)"
+            st.query_params["job"] = load_job_manager().submit(
+                "crawl", label, {"urls": sites, "depth": depth, "max_pages": max_pages, **profile})
+    
+    job = current_job(("website", "crawl"))
+    if job:
+        display_job(job, display_page_job if job["kind"] == "website" else display_crawl_results)
+    recent_jobs(("website", "crawl"))
     st.markdown('</div>', unsafe_allow_html=True)
 
 # CSV Analysis Section
@@ -357,128 +697,98 @@ elif option == "CSV Analysis":
     st.markdown('<div class="card">', unsafe_allow_html=True)
     st.markdown("### 📊 Customer Feedback Analysis")
     
-    uploaded_file = st.file_uploader("Upload CSV file with customer feedback", type="csv")
+    from ingest import FILE_TYPES
+    
+    uploaded_file = st.file_uploader("Upload a CSV, Parquet or Feather file with customer feedback", type=FILE_TYPES)
+    job = current_job(("csv",))
     
     if uploaded_file is not None:
         try:
-            df = pd.read_csv(uploaded_file)
+            from ingest import STREAMING_THRESHOLD
+
+            streaming = st.toggle("Streaming mode for large files",
+                                  value=uploaded_file.size > STREAMING_THRESHOLD,
+                                  help="Reads the file in chunks so memory stays flat. File metrics fill in during analysis.")
+            progressive = st.toggle("Progressive estimate", value=False,
+                                    help="Scores reviews in random order and shows estimates with confidence "
+                                         "intervals within seconds. They narrow as more reviews are scored until "
+                                         "the exact result; stop whenever the answer is good enough. Duplicates "
+                                         "are kept, and trends and drill-down need a full analysis.")
+            
+            # Parsed once per file content; reruns and other sessions reuse it
+            upload = load_upload_cache().get(uploaded_file, full=not streaming)
             
             # Display metrics about the uploaded file
             col1, col2, col3 = st.columns(3)
-            
-            with col1:
-                st.markdown(f"""
-                <div class="scattered-metric">
-                    <h3 style="margin: 0; font-size: 1.8rem;">{len(df)}</h3>
-                    <p style="margin: 0; font-size: 0.9rem;">Total Reviews</p>
-                </div>
-                """, unsafe_allow_html=True)
-            
-            with col2:
-                st.markdown(f"""
-                <div class="scattered-metric">
-                    <h3 style="margin: 0; font-size: 1.8rem;">{len(df.columns)}</h3>
-                    <p style="margin: 0; font-size: 0.9rem;">Data Columns</p>
-                </div>
-                """, unsafe_allow_html=True)
-            
-            with col3:
-                missing_data = df.isnull().sum().sum()
-                st.markdown(f"""
-                <div class="scattered-metric">
-                    <h3 style="margin: 0; font-size: 1.8rem;">{missing_data}</h3>
-                    <p style="margin: 0; font-size: 0.9rem;">Missing Values</p>
-                </div>
-                """, unsafe_allow_html=True)
+            col2.markdown(metric_card(len(upload.columns), "Data Columns"), unsafe_allow_html=True)
+            if upload.rows is not None:
+                col1.markdown(metric_card(upload.rows, "Total Reviews"), unsafe_allow_html=True)
+                col3.markdown(metric_card(upload.missing, "Missing Reviews"), unsafe_allow_html=True)
+            elif (job and job["result"] and job["result"]["file"] == uploaded_file.name
+                  and not job["result"].get("partial")):
+                # Streaming mode only knows these once the whole file has been read
+                # (a progressive analysis once it has read the review column)
+                col1.markdown(metric_card(job["result"]["rows"], "Total Reviews"), unsafe_allow_html=True)
+                col3.markdown(metric_card(job["result"]["missing"], "Missing Reviews"), unsafe_allow_html=True)
+            else:
+                col1.markdown(metric_card("…", "Total Reviews"), unsafe_allow_html=True)
+                col3.markdown(metric_card("…", "Missing Reviews"), unsafe_allow_html=True)
             
             # Simple preview
             st.write("Data preview:")
-            st.dataframe(df.head(3))
+            st.dataframe(upload.sample.head(3))
             
-            # Find text columns
-            text_columns = []
-            for col in df.columns:
-                if any(keyword in col.lower() for keyword in ['review', 'feedback', 'comment', 'text']):
-                    text_columns.append(col)
-            
-            if text_columns:
-                selected_column = st.selectbox("Select column to analyze:", text_columns)
+            if upload.text_columns:
+                selected_column = st.selectbox("Select column to analyze:", upload.text_columns)
+                date_column = st.selectbox("Date column for sentiment trends:", [*upload.date_columns, None],
+                                           format_func=lambda c: "None" if c is None else c, disabled=progressive)
                 
-                if st.button("Analyze Feedback", type="primary"):
-                    all_text = " ".join(df[selected_column].dropna().astype(str))
-                    
-                    # Sentiment analysis
-                    sentiment = sia.polarity_scores(all_text)
-                    health_score = int(sentiment["pos"] * 100)
-                    
-                    # Display scattered metrics for the analysis
-                    col1, col2, col3 = st.columns(3)
-                    
-                    with col1:
-                        st.markdown(f"""
-                        <div class="scattered-metric">
-                            <h3 style="margin: 0; font-size: 1.8rem;">{len(all_text.split())}</h3>
-                            <p style="margin: 0; font-size: 0.9rem;">Words Analyzed</p>
-                        </div>
-                        """, unsafe_allow_html=True)
-                    
-                    with col2:
-                        st.markdown(f"""
-                        <div class="scattered-metric">
-                            <h3 style="margin: 0; font-size: 1.8rem;">{health_score}</h3>
-                            <p style="margin: 0; font-size: 0.9rem;">Satisfaction Score</p>
-                        </div>
-                        """, unsafe_allow_html=True)
-                    
-                    with col3:
-                        positive_reviews = sum(1 for text in df[selected_column].dropna() if sia.polarity_scores(text)['pos'] > 0.5)
-                        st.markdown(f"""
-                        <div class="scattered-metric">
-                            <h3 style="margin: 0; font-size: 1.8rem;">{positive_reviews}</h3>
-                            <p style="margin: 0; font-size: 0.9rem;">Positive Reviews</p>
-                        </div>
-                        """, unsafe_allow_html=True)
-                    
-                    # Display results
-                    col1, col2 = st.columns(2)
-                    
-                    with col1:
-                        st.subheader("Sentiment Analysis")
-                        st.metric("Positive", f"{sentiment['pos']*100:.1f}%")
-                        st.metric("Neutral", f"{sentiment['neu']*100:.1f}%")
-                        st.metric("Negative", f"{sentiment['neg']*100:.1f}%")
-                        
-                        st.subheader("Satisfaction Score")
-                        if health_score >= 70:
-                            st.success(f"{health_score}/100")
-                        elif health_score >= 40:
-                            st.warning(f"{health_score}/100")
-                        else:
-                            st.error(f"{health_score}/100")
-                        st.progress(health_score/100)
-                    
-                    with col2:
-                        st.subheader("Word Cloud")
-                        wordcloud = WordCloud(width=400, height=300, background_color='white').generate(all_text)
-                        fig, ax = plt.subplots()
-                        ax.imshow(wordcloud, interpolation='bilinear')
-                        ax.axis('off')
-                        st.pyplot(fig)
+                from dedupe import DEFAULT_THRESHOLD
+                
+                col1, col2 = st.columns(2)
+                skip_duplicates = col1.toggle("Skip duplicate reviews", value=not streaming, disabled=progressive,
+                                              help="Scores and counts one review per group of duplicates and "
+                                                   "near-duplicates, such as cross-posts and templated feedback. "
+                                                   "Off by default in streaming mode, as near-duplicate matching "
+                                                   "takes longer than scoring.")
+                similarity = col2.slider("Near-duplicate similarity", min_value=0.5, max_value=1.0,
+                                         value=DEFAULT_THRESHOLD, step=0.05,
+                                         disabled=progressive or not skip_duplicates,
+                                         help="How much of two reviews' wording must overlap. 1.0 skips exact "
+                                              "duplicates only.")
+                
+                with st.expander("Benchmark this result (optional)"):
+                    from percentiles import BAKERY_TYPES
                     
-                    # Simple insights
-                    st.subheader("Insights")
-                    if health_score >= 70:
-                        st.success("Customers are very satisfied with your bakery!")
-                    elif health_score >= 40:
-                        st.info("Moderate customer satisfaction. Some areas need improvement.")
-                    else:
-                        st.warning("Low customer satisfaction. Immediate attention needed.")
+                    benchmark_type = st.selectbox("Bakery type", ["", *BAKERY_TYPES])
+                    benchmark_location = st.text_input("Location (city)")
+                
+                if st.button("Analyze Feedback", type="primary"):
+                    # Runs in a worker process, so changing the widgets above no longer restarts it.
+                    # The same file and settings reattach to the finished analysis instead.
+                    st.query_params["job"] = load_job_manager().submit(
+                        "csv", f"{uploaded_file.name} ({selected_column})", {
+                            "name": uploaded_file.name,
+                            "column": selected_column,
+                            "date_column": None if progressive else date_column,
+                            "dedupe": similarity if skip_duplicates and not progressive else None,
+                            "streaming": streaming and not progressive,
+                            "progressive": progressive,
+                            "bakery_type": benchmark_type,
+                            "location": benchmark_location.strip(),
+                            **profile,
+                        }, upload=uploaded_file, content_hash=upload.key)
+                    job = current_job(("csv",))
             
             else:
                 st.warning("No review columns found. Ensure your CSV has columns like 'review', 'feedback', or 'comments'.")
                 
         except Exception as e:
             st.error(f"Error analyzing CSV: {str(e)}")
+    
+    if job:
+        display_job(job, display_csv_job)
+    recent_jobs(("csv",))
     st.markdown('</div>', unsafe_allow_html=True)
 
 # Data Upload Section with built-in form
@@ -491,6 +801,8 @@ else:
     This information helps train better models for the bakery industry.
     """)
     
+    from percentiles import BAKERY_TYPES
+    
     # Built-in form for data collection
     with st.form("bakery_data_form"):
         st.markdown("#### 🏪 Bakery Information")
@@ -502,8 +814,7 @@ else:
             bakery_location = st.text_input("Location (City, Country)*")
         
         with col2:
-            bakery_type = st.selectbox("Bakery Type*", 
-                                     ["", "Artisan", "Commercial", "Cafe", "Pastry Shop", "Home-based", "Other"])
+            bakery_type = st.selectbox("Bakery Type*", ["", *BAKERY_TYPES])
             years_operation = st.number_input("Years in Operation", min_value=0, max_value=100, value=0)
         
         st.markdown("#### 🍰 Product Information")
@@ -529,9 +840,28 @@ else:
         submitted = st.form_submit_button("Submit Data", type="primary")
         
         if submitted:
-            if not bakery_name or not bakery_location or not bakery_type or not products:
+            from engine import analyze_submission, validate_submission
+            
+            submission = {
+                "bakery_name": bakery_name,
+                "bakery_location": bakery_location,
+                "bakery_type": bakery_type,
+                "years_operation": years_operation,
+                "products": products,
+                "rating": rating,
+                "common_feedback": common_feedback,
+                "challenges": challenges,
+                "success_factors": success_factors,
+            }
+            
+            if validate_submission(submission):
                 st.error("Please fill in all required fields (*)")
             else:
+                summary = analyze_submission(submission)
+                from percentiles import benchmark
+                
+                rating_benchmark = benchmark(load_percentile_store(), "rating", rating, bakery_type, bakery_location)
+                load_submission_store().add(submission)
                 st.success("""
                 ✅ **Thank you for submitting your bakery data!**
                 
@@ -544,7 +874,7 @@ else:
                 with col1:
                     st.markdown(f"""
                     <div class="scattered-metric">
-                        <h3 style="margin: 0; font-size: 1.8rem;">{len(products.split(','))}</h3>
+                        <h3 style="margin: 0; font-size: 1.8rem;">{summary['products_listed']}</h3>
                         <p style="margin: 0; font-size: 0.9rem;">Products Listed</p>
                     </div>
                     """, unsafe_allow_html=True)
@@ -552,7 +882,7 @@ else:
                 with col2:
                     st.markdown(f"""
                     <div class="scattered-metric">
-                        <h3 style="margin: 0; font-size: 1.8rem;">{rating}/5</h3>
+                        <h3 style="margin: 0; font-size: 1.8rem;">{summary['rating']}/5</h3>
                         <p style="margin: 0; font-size: 0.9rem;">Customer Rating</p>
                     </div>
                     """, unsafe_allow_html=True)
@@ -560,10 +890,12 @@ else:
                 with col3:
                     st.markdown(f"""
                     <div class="scattered-metric">
-                        <h3 style="margin: 0; font-size: 1.8rem;">{years_operation}</h3>
+                        <h3 style="margin: 0; font-size: 1.8rem;">{summary['years_operation']}</h3>
                         <p style="margin: 0; font-size: 0.9rem;">Years Operating</p>
                     </div>
                     """, unsafe_allow_html=True)
+                
+                st.info(f"📈 Your customer rating is {rating}/5. " + rating_benchmark)
     
     # Information about data usage
     st.markdown("""
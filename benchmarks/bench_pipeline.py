@@ -0,0 +1,337 @@
+"""Per-stage timing of the analysis hot paths on synthetic inputs.
+
+Generates feedback CSVs (1k to 10M rows) and bakery pages (10 KB to 10 MB),
+then times each stage on its own: fetch, HTML parse, keyword counting,
+sentiment scoring, word cloud, CSV ingestion and the whole streaming CSV
+analysis. Every (stage, size) pair runs in a fresh interpreter, so peak memory
+belongs to that stage alone. Results can be saved as JSON and checked against
+a stored baseline; any regression makes the exit status 1.
+
+    python benchmarks/bench_pipeline.py
+    python benchmarks/bench_pipeline.py --full --json after.json
+    python benchmarks/bench_pipeline.py --stages parse keywords --save-baseline
+    python benchmarks/bench_pipeline.py --baseline benchmarks/baseline.json
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+ROW_STAGES = ("sentiment", "wordcloud", "ingest", "csv")
+PAGE_STAGES = ("fetch", "parse", "keywords")
+STAGES = PAGE_STAGES + ROW_STAGES
+QUICK_ROWS = (1_000, 10_000, 100_000)
+FULL_ROWS = (1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+QUICK_PAGE_KB = (10, 100, 1_000)
+FULL_PAGE_KB = (10, 100, 1_000, 10_000)
+DEFAULT_BASELINE = os.path.join(ROOT, "benchmarks", "baseline.json")
+# Slower than the baseline by this fraction, and by more than the noise floor, is a regression
+TOLERANCE = 0.2
+NOISE_SECONDS = 0.005
+NOISE_MB = 10
+
+OPENERS = ["The", "Their", "This bakery's", "Our local", "My favourite", "Honestly the"]
+PRODUCTS = ["sourdough", "croissant", "cinnamon roll", "baguette", "cheesecake", "brownie",
+            "cupcake", "bagel", "eclair", "danish", "focaccia", "scone", "muffin", "pie"]
+VERDICTS = ["was absolutely delicious!", "tasted stale and dry.", "was fine, nothing special.",
+            "is the best in town :)", "was overpriced and disappointing.", "was fresh and warm.",
+            "could be better, service was slow.", "is NOT worth the wait.", "was great value."]
+EXTRAS = ["", " Friendly staff.", " Will come back!", " Long queue though.", " Coffee was cold.",
+          " Loved the atmosphere.", " Too sweet for me."]
+
+
+# Seeded synthetic reviews: about 5% are missing, lengths vary like real exports
+def make_reviews_csv(path, rows, seed=0, chunk=1_000_000):
+    import numpy as np
+    import pandas as pd
+
+    rng = np.random.default_rng(seed)
+    with open(path, "w", encoding="utf-8", newline="") as fh:
+        for start in range(0, rows, chunk):
+            n = min(chunk, rows - start)
+            parts = [np.asarray(words, dtype=object)[rng.integers(0, len(words), n)]
+                     for words in (OPENERS, PRODUCTS, VERDICTS, EXTRAS)]
+            review = pd.Series(parts[0] + " " + parts[1] + " " + parts[2] + parts[3])
+            review[rng.random(n) < 0.05] = None
+            frame = pd.DataFrame({
+                "id": np.arange(start, start + n),
+                "review": review,
+                "rating": rng.integers(1, 6, n),
+                "date": pd.Timestamp("2024-01-01") + pd.to_timedelta(rng.integers(0, 365, n), unit="D"),
+                "store": np.asarray(["Pune", "Mumbai", "Delhi", "Bengaluru"], dtype=object)[rng.integers(0, 4, n)],
+            })
+            frame.to_csv(fh, index=False, header=start == 0)
+
+
+# A bakery home page padded with menu sections to roughly `size` bytes
+def make_page(size, seed=0):
+    import random
+
+    rng = random.Random(seed)
+    head = ("<!DOCTYPE html><html><head><meta charset='utf-8'><title>Golden Crust Bakery</title>"
+            "<style>body{font-family:serif}.menu li{margin:4px}</style>"
+            "<script>window.dataLayer=[];function track(){return 1}</script></head><body>"
+            "<nav><a href='/'>Home</a> <a href='/menu'>Menu</a> <a href='/about'>About us</a>"
+            " <a href='/contact'>Contact</a></nav><h1>Golden Crust Bakery</h1>")
+    parts, total = [head], len(head)
+    section = 0
+    while total < size:
+        items = "".join(f"<li>{rng.choice(PRODUCTS).title()} &ndash; {rng.choice(VERDICTS)}{rng.choice(EXTRAS)}</li>"
+                        for _ in range(20))
+        block = (f"<section class='menu' id='s{section}'><h2>Fresh {rng.choice(PRODUCTS)} daily</h2>"
+                 f"<p>Open hours 7am to 7pm. Order online, delivery and catering available. "
+                 f"Quality organic ingredients, handmade and fresh every morning.</p><ul>{items}</ul>"
+                 f"<a href='/menu/{section}'>More</a><script>track({section})</script></section>")
+        parts.append(block)
+        total += len(block)
+        section += 1
+    parts.append("<footer>Contact us: hello@goldencrust.example</footer></body></html>")
+    return "".join(parts).encode("utf-8")
+
+
+def input_path(data_dir, stage, size):
+    if stage in ROW_STAGES:
+        path = os.path.join(data_dir, f"reviews-{size}.csv")
+        if not os.path.exists(path):
+            make_reviews_csv(path + ".tmp", size)
+            os.replace(path + ".tmp", path)
+    else:
+        path = os.path.join(data_dir, f"page-{size}kb.html")
+        if not os.path.exists(path):
+            with open(path + ".tmp", "wb") as fh:
+                fh.write(make_page(size * 1024))
+            os.replace(path + ".tmp", path)
+    return path
+
+
+# Peak resident memory in MB (ru_maxrss is KB on Linux, bytes on macOS)
+def peak_rss_mb(who=None):
+    import resource
+
+    usage = resource.getrusage(resource.RUSAGE_SELF if who is None else who).ru_maxrss
+    return usage / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+# Serve one body on a loopback port from a background thread
+def serve(body):
+    import threading
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}/"
+
+
+# The stage under test as a zero-argument callable, and the units it processes
+def prepare(stage, path):
+    if stage in PAGE_STAGES:
+        import website
+
+        with open(path, "rb") as fh:
+            html = fh.read()
+        if stage == "fetch":
+            import requests
+
+            url, session = serve(html), requests.Session()
+            return lambda: len(website.fetch_page(url, session).content), "bytes"
+        if stage == "parse":
+            return lambda: len(html) if website.extract_text(html, "text/html") else 0, "bytes"
+        text, _ = website.extract_text(html, "text/html")
+        website.count_terms(text[:1000])
+        return lambda: len(text.encode("utf-8")) if website.count_terms(text) is not None else 0, "bytes"
+
+    if stage == "ingest":
+        from ingest import read_chunks
+
+        # FeedbackStream's chunked read (only the review column, as Arrow
+        # strings) and its file metrics, without scoring
+        def ingest():
+            rows = 0
+            for chunk in read_chunks(path, ["review"], text_columns=["review"]):
+                rows += len(chunk)
+                chunk["review"].isna().sum()
+                chunk["review"].dropna().astype(str).str.split().str.len().sum()
+            return rows
+        return ingest, "rows"
+    if stage == "csv":
+        from engine import analyze_csv
+
+        return lambda: analyze_csv(path, "review", streaming=True)["rows"], "rows"
+
+    from ingest import read_frame
+
+    reviews = read_frame(path, ["review"], text_columns=["review"])["review"].dropna().astype(str)
+    if stage == "sentiment":
+        from sentiment import MIN_PARALLEL, score_reviews
+
+        # Load the model (and start the worker pool, if the size needs one) before timing
+        score_reviews(reviews[:MIN_PARALLEL] if len(reviews) >= MIN_PARALLEL else reviews[:100])
+        return lambda: len(score_reviews(reviews)), "rows"
+
+    # Word counts plus a fresh render: the cached image is removed before each run
+    from terms import TermCounter, wordcloud_png
+
+    def wordcloud():
+        image = wordcloud_png(TermCounter().update(reviews).most_common())
+        os.remove(image)
+        return len(reviews)
+    return wordcloud, "rows"
+
+
+# Runs in the child interpreter; prints one JSON line
+def run_child(stage, path, repeat):
+    os.environ["BAKERY_ANALYZER_CACHE_DIR"] = tempfile.mkdtemp(prefix="bakery-bench-cache-")
+    import resource
+
+    run, unit = prepare(stage, path)
+    before = peak_rss_mb()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        processed = run()
+        times.append(time.perf_counter() - start)
+    peak = peak_rss_mb()
+    print(json.dumps({
+        "seconds": statistics.median(times),
+        "runs": times,
+        "processed": processed,
+        "unit": unit,
+        "peak_rss_mb": round(peak, 1),
+        "stage_rss_mb": round(peak - before, 1),
+        "workers_peak_rss_mb": round(peak_rss_mb(resource.RUSAGE_CHILDREN), 1),
+    }))
+
+
+def measure(stage, path, repeat):
+    out = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child", stage, path, str(repeat)],
+        cwd=ROOT, capture_output=True, text=True,
+    )
+    if out.returncode:
+        return {"error": out.stderr.strip().splitlines()[-1] if out.stderr.strip() else f"exit {out.returncode}"}
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def key_of(result):
+    return f"{result['stage']}/{result['size']}"
+
+
+# Human-readable regressions of `results` against a stored baseline
+def regressions(results, baseline, tolerance=TOLERANCE):
+    previous = {key_of(r): r for r in baseline.get("results", []) if "seconds" in r}
+    found = []
+    for result in results:
+        old = previous.get(key_of(result))
+        if old is None or "seconds" not in result:
+            continue
+        slower = result["seconds"] - old["seconds"]
+        if slower > max(old["seconds"] * tolerance, NOISE_SECONDS):
+            found.append(f"{key_of(result)}: {old['seconds']:.4f}s -> {result['seconds']:.4f}s "
+                         f"(+{slower / old['seconds']:.0%})")
+        grown = result["stage_rss_mb"] - old["stage_rss_mb"]
+        if grown > max(old["stage_rss_mb"] * tolerance, NOISE_MB):
+            found.append(f"{key_of(result)}: stage memory {old['stage_rss_mb']:.0f} MB -> "
+                         f"{result['stage_rss_mb']:.0f} MB")
+    return found
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    if len(sys.argv) == 5 and sys.argv[1] == "--child":
+        return run_child(sys.argv[2], sys.argv[3], int(sys.argv[4]))
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=list(STAGES))
+    parser.add_argument("--rows", nargs="+", type=int, help=f"CSV sizes (default: {QUICK_ROWS})")
+    parser.add_argument("--page-kb", nargs="+", type=int, help=f"page sizes in KB (default: {QUICK_PAGE_KB})")
+    parser.add_argument("--full", action="store_true", help="every size up to 10M rows and 10 MB pages")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per stage and size (median kept)")
+    parser.add_argument("--data-dir", default=os.path.join(tempfile.gettempdir(), "bakery-bench"),
+                        help="where generated inputs are kept between runs")
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="results to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the baseline")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE, help="allowed slowdown before flagging")
+    args = parser.parse_args()
+
+    rows = args.rows or (FULL_ROWS if args.full else QUICK_ROWS)
+    page_kb = args.page_kb or (FULL_PAGE_KB if args.full else QUICK_PAGE_KB)
+    os.makedirs(args.data_dir, exist_ok=True)
+
+    results = []
+    print(f"{'stage':<11}{'size':>12}{'median (s)':>12}{'throughput':>18}{'stage MB':>10}{'peak MB':>9}")
+    for stage in args.stages:
+        for size in (page_kb if stage in PAGE_STAGES else rows):
+            label = f"{size} KB" if stage in PAGE_STAGES else f"{size} rows"
+            result = {"stage": stage, "size": label,
+                      **measure(stage, input_path(args.data_dir, stage, size), args.repeat)}
+            if "error" in result:
+                print(f"{stage:<11}{label:>12}  error: {result['error']}")
+            else:
+                if result["unit"] == "bytes":
+                    result["throughput"] = round(result["processed"] / result["seconds"] / 1e6, 2)
+                    rate = f"{result['throughput']:.1f} MB/s"
+                else:
+                    result["throughput"] = round(result["processed"] / result["seconds"])
+                    rate = f"{result['throughput']:,} rows/s"
+                print(f"{stage:<11}{label:>12}{result['seconds']:>12.4f}{rate:>18}"
+                      f"{result['stage_rss_mb']:>10.1f}{result['peak_rss_mb']:>9.0f}")
+            results.append(result)
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+    if args.json:
+        with open(args.json, "w") as fh:
+            json.dump(report, fh, indent=2)
+
+    found = []
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as fh:
+            baseline = json.load(fh)
+        found = regressions(results, baseline, args.tolerance)
+        print(f"\nCompared with {args.baseline} (commit {baseline['meta'].get('commit')}):")
+        print("\n".join(f"  REGRESSION {line}" for line in found) or "  no regressions")
+    if args.save_baseline:
+        with open(args.baseline, "w") as fh:
+            json.dump(report, fh, indent=2)
+        print(f"\nBaseline saved to {args.baseline}")
+    return 1 if found else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
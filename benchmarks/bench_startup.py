@@ -0,0 +1,73 @@
+"""Cold-start and rerun timing for the Streamlit app.
+
+Runs app.py headlessly with Streamlit's AppTest. Every cold start uses a fresh
+interpreter, so imports and model setup are counted the way a new worker sees them.
+
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --app /path/to/old/app.py --runs 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TABS = ["Website Analysis", "CSV Analysis", "Upload Data"]
+
+# Executed in a fresh interpreter: time the first paint of a tab, then its reruns
+CHILD = r"""
+import json, sys, time
+t0 = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+app, tab, reruns = sys.argv[1], sys.argv[2], int(sys.argv[3])
+at = AppTest.from_file(app, default_timeout=120)
+at.run()
+if tab != "Website Analysis":
+    at.radio[0].set_value(tab).run()
+cold = time.perf_counter() - t0
+times = []
+for _ in range(reruns):
+    t = time.perf_counter()
+    at.run()
+    times.append(time.perf_counter() - t)
+print(json.dumps({"cold": cold, "reruns": times, "errors": [str(e.value) for e in at.exception]}))
+"""
+
+
+def time_tab(app, tab, reruns):
+    out = subprocess.run(
+        [sys.executable, "-c", CHILD, app, tab, str(reruns)],
+        cwd=os.path.dirname(os.path.abspath(app)),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--app", default=os.path.join(ROOT, "app.py"))
+    parser.add_argument("--runs", type=int, default=3, help="cold starts per tab")
+    parser.add_argument("--reruns", type=int, default=10, help="reruns timed after each cold start")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    results = {}
+    print(f"{'tab':<18}{'cold start (s)':>16}{'rerun median (ms)':>20}")
+    for tab in TABS:
+        samples = [time_tab(args.app, tab, args.reruns) for _ in range(args.runs)]
+        cold = statistics.median(s["cold"] for s in samples)
+        rerun = statistics.median(t for s in samples for t in s["reruns"])
+        results[tab] = {"cold_s": cold, "rerun_median_s": rerun, "errors": samples[-1]["errors"]}
+        print(f"{tab:<18}{cold:>16.2f}{rerun * 1000:>20.1f}")
+
+    if args.json:
+        with open(args.json, "w") as fh:
+            json.dump(results, fh, indent=2)
+
+
+if __name__ == "__main__":
+    main()
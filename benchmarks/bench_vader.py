@@ -0,0 +1,120 @@
+"""Check the VADER kernel against nltk and compare their single-core speed.
+
+Scores a golden corpus with both nltk's SentimentIntensityAnalyzer and
+vader_kernel.VaderKernel. The corpus is seeded: generated bakery reviews,
+random word soup over the whole lexicon with the booster, negation, "but",
+"least", "never so", idiom, ALL CAPS and punctuation cases mixed in, and
+a list of hand-written edge cases. Any score differing by more than the
+tolerance is printed and makes the exit status 1. Then both score the review
+corpus on one core and the reviews per second are reported.
+
+    python benchmarks/bench_vader.py
+    python benchmarks/bench_vader.py --reviews 200000 --json vader.json
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench_pipeline import EXTRAS, OPENERS, PRODUCTS, VERDICTS  # noqa: E402
+
+FIELDS = ("neg", "neu", "pos", "compound")
+# Scores are rounded to 3 (compound 4) decimals; anything past rounding noise is a mismatch
+TOLERANCE = 1e-4
+EDGE_CASES = [
+    "", " ", "!", "a", ":)", ":-(", "<3", "GOOD", "good", "Good!", "good!!!!!!", "good??", "good????",
+    "The croissant was not good", "The croissant wasn't good", "never so good", "never this bad",
+    "it was so good", "this good", "at least good", "very least good", "least good", "the least good",
+    "kind of good", "sort of bad", "kind of", "Kind of good", "just enough good", "The bread is the shit",
+    "this place is the bomb", "yeah right great service", "it cut the mustard nicely", "bad ass cake",
+    "the kiss of death for a bakery", "living hand to mouth", "good but bad", "bad BUT good",
+    "good but but bad", "The cake was GREAT but the coffee was BAD", "VERY GOOD", "very GOOD bread",
+    "EXTREMELY good bread", "extremely bad", "barely good", "hardly bad", "good good good bad",
+    "great, great; great: 'great' \"great\" -great great- great!? great?!?", "...great great...",
+    "great!! ,great .great", "isn't it great", "Nothing great", "without doubt great", "uh-uh good",
+    "n't good", "don't don't good", "not not not good", "not bad at all", "no good", "not the worst",
+    "Café très bon 😊 good", "good\tbread\nnice\r\nday", "#bad", "@good", "good :D", "good :(",
+]
+
+
+def golden_corpus(lexicon, reviews, seed=0):
+    from nltk.sentiment.vader import VaderConstants
+
+    rng = random.Random(seed)
+    texts = list(EDGE_CASES)
+    texts += [f"{rng.choice(OPENERS)} {rng.choice(PRODUCTS)} {rng.choice(VERDICTS)}{rng.choice(EXTRAS)}"
+              for _ in range(reviews)]
+    words = list(lexicon) + list(VaderConstants.BOOSTER_DICT) + list(VaderConstants.NEGATE)
+    words += ["but", "But", "BUT", "least", "at", "very", "never", "so", "this", "kind", "of", "sort",
+              "the", "shit", "bomb", "yeah", "right", "cut", "mustard", "hand", "to", "mouth", "bread"]
+    marks = ["", "", "", "!", ",", ".", "?", "'", "...", "!?!", "!!"]
+    for _ in range(reviews):
+        tokens = []
+        for _ in range(rng.randint(0, 20)):
+            word = rng.choice(words)
+            if rng.random() < 0.1:
+                word = word.upper()
+            mark = rng.choice(marks)
+            tokens.append(mark + word if rng.random() < 0.3 else word + mark)
+        texts.append(" ".join(tokens) + rng.choice(["", "!", "!!!!!", "??", "????", "?"]))
+    return texts
+
+
+def mismatches(reference, kernel, texts, tolerance=TOLERANCE):
+    found = []
+    for text in texts:
+        want, got = reference.polarity_scores(text), kernel.polarity_scores(text)
+        if any(abs(want[f] - got[f]) > tolerance for f in FIELDS):
+            found.append({"text": text, "nltk": want, "kernel": got})
+    return found
+
+
+def rate(score, texts, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        score(texts)
+        best = min(best, time.perf_counter() - start)
+    return len(texts) / best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--reviews", type=int, default=50_000, help="generated reviews of each kind")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs; the best one counts")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    from nltk.sentiment import SentimentIntensityAnalyzer
+
+    from vader_kernel import VaderKernel
+
+    reference = SentimentIntensityAnalyzer()
+    texts = golden_corpus(reference.lexicon, args.reviews)
+    found = mismatches(reference, VaderKernel(reference.lexicon), texts)
+    for case in found[:20]:
+        print(f"MISMATCH {case['text']!r}\n  nltk   {case['nltk']}\n  kernel {case['kernel']}")
+    print(f"{len(texts) - len(found):,} of {len(texts):,} golden texts match nltk (tolerance {TOLERANCE})")
+
+    reviews = texts[len(EDGE_CASES):len(EDGE_CASES) + args.reviews]
+    nltk_rate = rate(lambda batch: [reference.polarity_scores(t) for t in batch], reviews, args.repeat)
+    # A fresh kernel per run, so its token table is built inside the timing
+    kernel_rate = rate(lambda batch: VaderKernel(reference.lexicon).score_many(batch), reviews, args.repeat)
+    print(f"{'scorer':<10}{'reviews/s':>14}")
+    print(f"{'nltk':<10}{nltk_rate:>14,.0f}")
+    print(f"{'kernel':<10}{kernel_rate:>14,.0f}   ({kernel_rate / nltk_rate:.1f}x)")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as fh:
+            json.dump({"texts": len(texts), "mismatches": found, "nltk_rate": nltk_rate,
+                       "kernel_rate": kernel_rate}, fh, indent=2)
+    return 1 if found else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,237 @@
+"""Command-line batch analysis without Streamlit.
+
+    python cli.py csv exports/ --output results.json
+    python cli.py csv a.csv b.csv --column review --streaming --output results.parquet
+    python cli.py urls competitors.txt --depth 1 --output sites.json
+    python cli.py csv pune/ --bakery-type Cafe --location Pune
+    python cli.py csv exports/ --dedupe 0.9 --date-column date
+    python cli.py percentiles export --output sketches.json
+    python cli.py percentiles merge worker1.json worker2.json
+    python cli.py report results.json sites.json --output-dir reports/2026-10
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from dedupe import DEFAULT_THRESHOLD
+from sentiment import default_workers
+
+
+def _csv_paths(inputs):
+    from ingest import FILE_TYPES
+
+    paths = []
+    for item in inputs:
+        if os.path.isdir(item):
+            paths.extend(sorted(path for ext in FILE_TYPES for path in glob.glob(os.path.join(item, f"*.{ext}"))))
+        else:
+            paths.append(item)
+    return paths
+
+
+def _read_urls(path):
+    with open(path, encoding="utf-8") as fh:
+        return [line.strip() for line in fh if line.strip() and not line.lstrip().startswith("#")]
+
+
+# Runs in a worker process: one CSV, scored on a single core. With a bakery
+# type and location the satisfaction score also feeds the industry percentiles.
+def _analyze_csv_file(path, column, streaming, use_cache, bakery_type=None, location=None, date_column=None,
+                      dedupe=None):
+    from engine import analyze_csv
+    from profiling import recording
+    from score_cache import ScoreCache
+    from trends import TrendStore
+
+    try:
+        cache = ScoreCache() if use_cache else None
+        trends = TrendStore() if use_cache and date_column else None
+        with recording("csv"):
+            result = analyze_csv(path, column=column, streaming=streaming, cache=cache, workers=1,
+                                 date_column=date_column, trends=trends, dedupe=dedupe)
+    except Exception as e:
+        return {"file": path, "error": str(e)}
+
+    if bakery_type and location and result["reviews"]:
+        from percentiles import PercentileStore, region_of
+
+        PercentileStore().observe("satisfaction", bakery_type, region_of(location),
+                                  result["sentiment"]["satisfaction"])
+    return result
+
+
+def run_csv(args):
+    paths = _csv_paths(args.inputs)
+    if not paths:
+        sys.exit("No CSV files found.")
+    # Like the app: duplicates are skipped by default, except in streaming mode
+    dedupe = args.dedupe
+    if dedupe is None:
+        dedupe = None if args.streaming else DEFAULT_THRESHOLD
+
+    results = []
+    with ProcessPoolExecutor(max_workers=min(args.workers, len(paths))) as pool:
+        futures = [pool.submit(_analyze_csv_file, path, args.column, args.streaming, not args.no_cache,
+                               args.bakery_type, args.location, args.date_column,
+                               None if args.keep_duplicates else dedupe)
+                   for path in paths]
+        for future in as_completed(futures):
+            result = future.result()
+            status = result.get("error") or f"{result['reviews']} reviews, satisfaction {result['sentiment']['satisfaction']}"
+            print(f"{result['file']}: {status}", file=sys.stderr)
+            results.append(result)
+    return sorted(results, key=lambda r: r["file"])
+
+
+def run_urls(args):
+    from engine import crawl_websites
+    from http_cache import HttpCache
+    from profiling import recording
+
+    cache = None if args.no_cache else HttpCache()
+
+    def progress(site, page):
+        print(f"{page['url']}: {page.get('error', 'ok')}", file=sys.stderr)
+
+    with recording("crawl"):
+        return crawl_websites(_read_urls(args.file), max_depth=args.depth, max_pages=args.max_pages,
+                              cache=cache, on_page=progress)
+
+
+# Sketches from other machines are merged into the local store; export writes
+# the local sketches in the same shape
+def run_percentiles(args):
+    from percentiles import PercentileStore
+
+    store = PercentileStore()
+    if args.action == "export":
+        return store.export()
+
+    merged = []
+    for path in args.files:
+        with open(path, encoding="utf-8") as fh:
+            exported = json.load(fh)
+        store.merge(exported)
+        merged.append({"file": path, "sketches": len(exported)})
+        print(f"{path}: merged {len(exported)} sketches", file=sys.stderr)
+    return merged
+
+
+# Runs in a worker process: one PDF, built in memory and renamed into `path`
+def _write_report(result, path):
+    from reports import source_of, write_report
+
+    try:
+        return {"source": source_of(result), "report": write_report(result, path)}
+    except Exception as e:
+        return {"source": source_of(result), "error": str(e)}
+
+
+# PDF reports from saved csv and urls results, one per feedback file or site,
+# written in parallel; shared charts are drawn once (see reports.py)
+def run_report(args):
+    from reports import report_names
+
+    results = []
+    for path in args.inputs:
+        with open(path, encoding="utf-8") as fh:
+            loaded = json.load(fh)
+        results.extend(loaded if isinstance(loaded, list) else [loaded])
+    if not results:
+        sys.exit("No results to report on.")
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    paths = [os.path.join(args.output_dir, name) for name in report_names(results)]
+    written = []
+    with ProcessPoolExecutor(max_workers=min(args.workers, len(results))) as pool:
+        futures = [pool.submit(_write_report, result, path) for result, path in zip(results, paths)]
+        for future in as_completed(futures):
+            report = future.result()
+            print(f"{report['source']}: {report.get('error') or report['report']}", file=sys.stderr)
+            written.append(report)
+    return sorted(written, key=lambda r: r["source"])
+
+
+# Variable-shape fields stored as JSON strings in Parquet output
+NESTED_FIELDS = ("frequencies", "page_results", "trend")
+
+
+# JSON keeps nested results as they are; Parquet gets one flat row per result
+def write_results(results, output, fmt):
+    if fmt == "parquet":
+        import pandas as pd
+
+        rows = [{key: json.dumps(value) if key in NESTED_FIELDS else value for key, value in result.items()}
+                for result in results]
+        table = pd.json_normalize(rows, max_level=1)
+        for col in table.columns:
+            if table[col].map(lambda v: isinstance(v, (dict, list))).any():
+                table[col] = table[col].map(json.dumps)
+        table.to_parquet(output, index=False)
+    elif output == "-":
+        json.dump(results, sys.stdout, indent=2)
+        print()
+    else:
+        with open(output, "w", encoding="utf-8") as fh:
+            json.dump(results, fh, indent=2)
+
+
+def main(argv=None):
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--output", "-o", default="-", help="output file (default: JSON on stdout)")
+    common.add_argument("--format", choices=["json", "parquet"],
+                        help="output format (default: from the output file extension)")
+    common.add_argument("--no-cache", action="store_true", help="skip the on-disk score and HTTP caches")
+    common.add_argument("--metrics", help="write per-stage timings to this file (.prom for Prometheus, else JSON lines)")
+
+    parser = argparse.ArgumentParser(description="Bakery Analyzer batch analysis")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    csv_cmd = commands.add_parser("csv", parents=[common], help="analyze customer feedback files (CSV, Parquet, Feather)")
+    csv_cmd.add_argument("inputs", nargs="+", help="feedback files, or directories of them")
+    csv_cmd.add_argument("--column", help="review column (default: first column that looks like reviews)")
+    csv_cmd.add_argument("--streaming", action="store_true", help="read files in chunks to bound memory")
+    csv_cmd.add_argument("--workers", type=int, default=default_workers(), help="files analyzed in parallel")
+    csv_cmd.add_argument("--date-column", help="date column for per-day sentiment trends")
+    csv_cmd.add_argument("--dedupe", type=float, metavar="SIMILARITY",
+                         help=f"similarity at which reviews count as duplicates and are scored once "
+                              f"(default {DEFAULT_THRESHOLD}, or off with --streaming; 1.0 for exact "
+                              f"duplicates only)")
+    csv_cmd.add_argument("--keep-duplicates", action="store_true", help="score and count every review")
+    csv_cmd.add_argument("--bakery-type", help="add each satisfaction score to this bakery type's percentiles")
+    csv_cmd.add_argument("--location", help="city for the percentiles (used with --bakery-type)")
+    csv_cmd.set_defaults(run=run_csv)
+
+    urls_cmd = commands.add_parser("urls", parents=[common], help="analyze bakery websites")
+    urls_cmd.add_argument("file", help="text file with one URL per line")
+    urls_cmd.add_argument("--depth", type=int, default=0, help="same-site link depth to crawl")
+    urls_cmd.add_argument("--max-pages", type=int, default=25, help="page limit per site")
+    urls_cmd.set_defaults(run=run_urls)
+
+    pct_cmd = commands.add_parser("percentiles", parents=[common], help="export or merge percentile sketches")
+    pct_cmd.add_argument("action", choices=["export", "merge"])
+    pct_cmd.add_argument("files", nargs="*", help="exported sketch files to merge")
+    pct_cmd.set_defaults(run=run_percentiles)
+
+    report_cmd = commands.add_parser("report", parents=[common], help="write PDF reports from saved results")
+    report_cmd.add_argument("inputs", nargs="+", help="JSON output of the csv or urls commands")
+    report_cmd.add_argument("--output-dir", "-d", default="reports", help="folder for the PDFs (default: reports)")
+    report_cmd.add_argument("--workers", type=int, default=default_workers(), help="reports written in parallel")
+    report_cmd.set_defaults(run=run_report)
+
+    args = parser.parse_args(argv)
+    if args.metrics:
+        # Read by profiling.recording, here and in the worker processes
+        os.environ["BAKERY_ANALYZER_METRICS"] = args.metrics
+    fmt = args.format or ("parquet" if args.output.endswith(".parquet") else "json")
+    if fmt == "parquet" and args.output == "-":
+        parser.error("--format parquet needs an --output file")
+
+    write_results(args.run(args), args.output, fmt)
+
+
+if __name__ == "__main__":
+    main()
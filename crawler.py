@@ -0,0 +1,161 @@
+"""Concurrent same-domain crawler producing site-level bakery reports."""
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from urllib.parse import urldefrag, urljoin, urlparse
+
+from profiling import propagate
+from website import analyze_page, fetch_page
+
+WORKERS = 16
+PER_HOST = 2
+# Minimum seconds between two requests to the same host
+MIN_INTERVAL = 0.5
+# Only follow links that look like HTML pages
+SKIP_EXTENSIONS = (".jpg", ".jpeg", ".png", ".gif", ".svg", ".webp", ".pdf", ".zip", ".css", ".js", ".ico", ".mp4")
+
+
+def host_of(url):
+    return urlparse(url).netloc.lower()
+
+
+# "www.example.com" and "example.com" are the same site
+def same_site(host, other):
+    return host.removeprefix("www.") == other.removeprefix("www.")
+
+
+def normalize_url(url):
+    url = url.strip()
+    if url and "://" not in url:
+        url = "https://" + url
+    return url
+
+
+# Per-host concurrency cap plus a minimum gap between request starts
+class HostLimiter:
+    def __init__(self, per_host=PER_HOST, min_interval=MIN_INTERVAL):
+        self.per_host = per_host
+        self.min_interval = min_interval
+        self._lock = threading.Lock()
+        self._slots = {}
+        self._next_start = defaultdict(float)
+
+    def _slot(self, host):
+        with self._lock:
+            if host not in self._slots:
+                self._slots[host] = threading.BoundedSemaphore(self.per_host)
+            return self._slots[host]
+
+    def __call__(self, host, func, *args):
+        with self._slot(host):
+            with self._lock:
+                start = max(time.monotonic(), self._next_start[host])
+                self._next_start[host] = start + self.min_interval
+            delay = start - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            return func(*args)
+
+
+def _session(workers):
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    session = requests.Session()
+    # Keep-alive connections are reused across pages of the same host
+    adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+# Word-weighted merge of per-page results into one site report
+def merge_pages(site, pages):
+    ok = [p for p in pages if "error" not in p]
+    words = sum(p["words"] for p in ok)
+    term_counts = Counter()
+    sentiment = Counter()
+    for page in ok:
+        term_counts.update(page["term_counts"])
+        weight = page["words"] / words if words else 1 / len(ok)
+        for key in ("neg", "neu", "pos", "compound"):
+            sentiment[key] += page["sentiment"][key] * weight
+
+    sentiment = {key: sentiment[key] for key in ("neg", "neu", "pos", "compound")}
+    return {
+        "site": site,
+        "pages": len(ok),
+        "errors": len(pages) - len(ok),
+        "words": words,
+        "term_counts": dict(term_counts),
+        "sentiment": sentiment,
+        "health_score": int(sentiment["pos"] * 100),
+        "page_results": pages,
+    }
+
+
+class Crawler:
+    def __init__(self, max_depth=1, max_pages=25, workers=WORKERS, per_host=PER_HOST,
+                 min_interval=MIN_INTERVAL, cache=None):
+        self.max_depth = max_depth
+        self.max_pages = max_pages
+        self.workers = workers
+        self.limiter = HostLimiter(per_host, min_interval)
+        self.session = _session(workers)
+        self.cache = cache
+
+    def _page(self, url, depth):
+        try:
+            # Fresh cached copies skip the network, so they skip the host limits too
+            page = self.cache.fresh(url) if self.cache is not None else None
+            if page is None:
+                page = self.limiter(host_of(url), fetch_page, url, self.session, self.cache)
+            if "html" not in (page.content_type or "text/html"):
+                return {"url": url, "depth": depth, "error": "not an HTML page"}, []
+            result, hrefs = analyze_page(page, self.cache)
+            links = [urldefrag(urljoin(page.url, href))[0] for href in hrefs]
+            return {"url": url, "depth": depth, "source": page.source, **result}, links
+        except Exception as e:
+            return {"url": url, "depth": depth, "error": str(e)}, []
+
+    def _follow(self, link, site_host):
+        parsed = urlparse(link)
+        return (parsed.scheme in ("http", "https")
+                and same_site(parsed.netloc.lower(), site_host)
+                and not parsed.path.lower().endswith(SKIP_EXTENSIONS))
+
+    # Crawl every start URL to max_depth; returns one merged report per site
+    def crawl(self, urls, on_page=None):
+        starts = list(dict.fromkeys(normalize_url(u) for u in urls if u.strip()))
+        seen = {url: {url} for url in starts}
+        pages = {url: [] for url in starts}
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            pending = {pool.submit(propagate(self._page), url, 0): url for url in starts}
+            try:
+                while pending:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        site = pending.pop(future)
+                        page, links = future.result()
+                        pages[site].append(page)
+                        if on_page is not None:
+                            on_page(site, page)
+
+                        if page["depth"] >= self.max_depth:
+                            continue
+                        site_host = host_of(site)
+                        for link in links:
+                            if len(seen[site]) >= self.max_pages:
+                                break
+                            if link not in seen[site] and self._follow(link, site_host):
+                                seen[site].add(link)
+                                pending[pool.submit(propagate(self._page), link, page["depth"] + 1)] = site
+            except BaseException:
+                # A cancelled job raises from on_page; drop the queued pages so
+                # leaving the pool only waits for the fetches already running
+                pool.shutdown(wait=False, cancel_futures=True)
+                raise
+
+        return [merge_pages(site, pages[site]) for site in starts]
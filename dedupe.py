@@ -0,0 +1,225 @@
+"""Duplicate and near-duplicate review detection, run before scoring.
+
+Reviews are compared after case folding, with punctuation and runs of
+whitespace reduced to single spaces. Exact duplicates are found by a 64-bit
+hash of that text. Near duplicates (templated feedback, lightly edited
+cross-posts) are found with MinHash signatures over character 5-grams:
+LSH banding proposes candidate pairs, and a candidate only counts when the
+signatures estimate a Jaccard similarity of at least the threshold.
+
+Reviews are clustered greedily in file order. The first review of a cluster
+is kept and scored; later reviews that duplicate a kept one are left out of
+scoring and of every metric. State carries over between chunks, so streaming
+and whole-file analysis keep the same reviews.
+
+The state is bounded by MEMORY however long the file is. Kept reviews are
+remembered by their exact-text digest, their 32-bit LSH band keys and a
+16-bit-per-permutation MinHash sketch for verifying candidates; the full
+signatures are dropped after each chunk. Each chunk's entries are added as a
+sorted run and runs of similar size are merged, so an entry is copied a
+logarithmic number of times rather than once per chunk. Past the budget the
+oldest runs are forgotten: a review is then only compared with the most
+recent kept reviews (several hundred thousand at the default threshold).
+"""
+import hashlib
+
+import numpy as np
+
+from profiling import stage
+
+DEFAULT_THRESHOLD = 0.8
+NUM_PERM = 64
+SHINGLE = 5
+# Reviews hashed per batch; bounds the temporary shingle arrays
+BATCH = 5000
+# Wanted chance that a pair at exactly the threshold shares at least one band
+RECALL = 0.95
+# Bytes of state carried between chunks, for each of the exact and near tables
+MEMORY = 64 << 20
+# Chance that two 16-bit sketch values agree by accident
+SKETCH_COLLISION = 1 / 65536
+
+
+def normalize(texts):
+    return texts.str.lower().str.replace(r"[\W_]+", " ", regex=True).str.strip()
+
+
+# (rows, bands) for a threshold: as many rows per band as the recall allows,
+# so unrelated reviews rarely become candidates
+def lsh_bands(threshold, num_perm=NUM_PERM):
+    best = (1, num_perm)
+    for rows in range(1, num_perm + 1):
+        bands = num_perm // rows
+        if 1 - (1 - threshold ** rows) ** bands >= RECALL:
+            best = (rows, bands)
+    return best
+
+
+# Sorted runs of (key, value) entries, oldest first. Each add is a new run and
+# runs of similar size are merged, so an entry is merged O(log n) times instead
+# of the whole table being re-copied per chunk. Runs stop growing at an eighth
+# of `cap`, and the oldest runs are dropped to stay within `cap` entries.
+class _Runs:
+    def __init__(self, cap):
+        self.cap = cap
+        self.runs = []
+        self.size = 0
+
+    def add(self, keys, values):
+        if not len(keys):
+            return
+        order = np.argsort(keys, kind="stable")
+        self.runs.append((keys[order], values[order]))
+        self.size += len(keys)
+        while len(self.runs) > 1:
+            (older, older_values), (newer, newer_values) = self.runs[-2:]
+            if len(older) > 2 * len(newer) or len(older) + len(newer) > self.cap // 8:
+                break
+            merged = np.concatenate([older, newer])
+            # Stable, so equal keys stay oldest first
+            order = np.argsort(merged, kind="stable")
+            self.runs[-2:] = [(merged[order], np.concatenate([older_values, newer_values])[order])]
+        while self.size > self.cap and len(self.runs) > 1:
+            self.size -= len(self.runs.pop(0)[0])
+
+    # (found, values): whether each key is present, and the value of its oldest entry
+    def find(self, keys):
+        # Sorted needles walk each run in order instead of missing cache per key
+        order = np.argsort(keys)
+        needles = keys[order]
+        found = np.zeros(len(keys), dtype=bool)
+        values = np.zeros(len(keys), dtype=np.int64)
+        for table, table_values in self.runs:
+            at = np.searchsorted(table, needles).clip(max=len(table) - 1)
+            hit = ~found & (table[at] == needles)
+            values[hit] = table_values[at[hit]]
+            found |= hit
+        found[order], values[order] = found.copy(), values.copy()
+        return found, values
+
+
+# Keeps one review per cluster of duplicates across all chunks of a file
+class Deduplicator:
+    # A threshold of 1 or more finds exact duplicates only
+    def __init__(self, threshold=DEFAULT_THRESHOLD, num_perm=NUM_PERM, seed=1):
+        self.threshold = threshold
+        self.near_enabled = threshold < 1
+        self.rows, self.bands = lsh_bands(min(threshold, 0.99), num_perm)
+        rng = np.random.default_rng(seed)
+        # Multiply-shift hash functions, one per permutation
+        self._a = rng.integers(0, 1 << 63, num_perm, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+        self._b = rng.integers(0, 1 << 63, num_perm, dtype=np.uint64)
+        self._seen = _Runs(MEMORY // 8)
+        # Kept reviews remembered for near-duplicate matching: each band's
+        # sorted keys, pointing at the review's slot in a ring of sketches
+        self.capacity = MEMORY // (2 * num_perm + 8 * self.bands)
+        self._bands = [_Runs(self.capacity) for _ in range(self.bands)]
+        self._sketches = np.zeros((self.capacity, num_perm), dtype=np.uint16) if self.near_enabled else None
+        self._kept = 0
+        self.exact = 0
+        self.near = 0
+
+    @property
+    def duplicates(self):
+        return self.exact + self.near
+
+    # Boolean mask over `reviews` (a Series of strings): True for reviews to keep
+    def keep(self, reviews):
+        with stage("dedupe", len(reviews), "reviews"):
+            texts = normalize(reviews).tolist()
+            digests = np.fromiter(
+                (int.from_bytes(hashlib.blake2b(t.encode("utf-8"), digest_size=8).digest(), "little") for t in texts),
+                dtype=np.uint64, count=len(texts),
+            )
+            # First occurrence within the chunk, and not seen in an earlier chunk
+            _, first = np.unique(digests, return_index=True)
+            keep = np.zeros(len(texts), dtype=bool)
+            keep[first] = True
+            keep &= ~self._seen.find(digests)[0]
+            self.exact += len(texts) - int(keep.sum())
+            new = np.flatnonzero(keep)
+            self._seen.add(digests[new], np.zeros(len(new), dtype=np.int8))
+
+            if self.near_enabled and len(new):
+                near = self._near_duplicates([texts[i] for i in new])
+                keep[new[near]] = False
+                self.near += int(near.sum())
+        return keep
+
+    # MinHash signatures (n, num_perm) of character shingles
+    def signatures(self, texts):
+        out = np.empty((len(texts), len(self._a)), dtype=np.uint32)
+        for start in range(0, len(texts), BATCH):
+            batch = [t.ljust(SHINGLE) for t in texts[start:start + BATCH]]
+            data = np.frombuffer("".join(batch).encode("utf-8"), dtype=np.uint8).astype(np.uint64)
+            lengths = np.fromiter((len(t.encode("utf-8")) for t in batch), dtype=np.int64, count=len(batch))
+            windows = lengths - SHINGLE + 1
+            # Byte offset of every shingle, never crossing into the next review
+            window_starts = np.cumsum(windows) - windows
+            byte_starts = np.cumsum(lengths) - lengths
+            offsets = np.arange(windows.sum()) + np.repeat(byte_starts - window_starts, windows)
+            shingles = np.zeros(len(offsets), dtype=np.uint64)
+            for j in range(SHINGLE):
+                shingles = shingles * np.uint64(257) + data[offsets + j]
+            hashed = np.empty_like(shingles)
+            # High 32 bits of each 64-bit product, without a shifted copy (little-endian)
+            high = hashed.view(np.uint32)[1::2] if np.little_endian else hashed.view(np.uint32)[::2]
+            for p, (a, b) in enumerate(zip(self._a, self._b)):
+                np.multiply(shingles, a, out=hashed)
+                np.add(hashed, b, out=hashed)
+                out[start:start + len(batch), p] = np.minimum.reduceat(high, window_starts)
+        return out
+
+    # 32-bit band keys; a rare collision only adds a candidate that fails verification
+    def _keys(self, signatures):
+        keys = np.empty((len(signatures), self.bands), dtype=np.uint32)
+        for band in range(self.bands):
+            key = np.full(len(signatures), 0xCBF29CE484222325, dtype=np.uint64)
+            for col in signatures[:, band * self.rows:(band + 1) * self.rows].T:
+                key = (key ^ col.astype(np.uint64)) * np.uint64(0x100000001B3)
+            keys[:, band] = key ^ (key >> np.uint64(32))
+        return keys
+
+    # True for the texts that are near duplicates of a kept review
+    def _near_duplicates(self, texts):
+        signatures = self.signatures(texts)
+        keys = self._keys(signatures)
+        # b-bit MinHash: the low 16 bits of each value are enough to estimate similarity
+        sketches = signatures.astype(np.uint16)
+        del signatures
+        n = len(texts)
+        near = np.zeros(n, dtype=bool)
+        pairs = []
+
+        for band in range(self.bands):
+            found, kept = self._bands[band].find(keys[:, band])
+            hit = np.flatnonzero(found)
+            similar = self._similarity(sketches[hit], self._sketches[kept[hit]]) >= self.threshold
+            near[hit[similar]] = True
+            # The first earlier text of this batch with the same band key
+            _, first, inverse = np.unique(keys[:, band], return_index=True, return_inverse=True)
+            earlier = first[inverse]
+            later = np.flatnonzero(earlier < np.arange(n))
+            pairs.append(np.stack([later, earlier[later]], axis=1))
+
+        pairs = np.unique(np.concatenate(pairs), axis=0)
+        pairs = pairs[self._similarity(sketches[pairs[:, 0]], sketches[pairs[:, 1]]) >= self.threshold]
+        # In order, so a text only counts as a duplicate of one that was kept
+        for i, match in pairs:
+            if not near[match]:
+                near[i] = True
+
+        # Only the last `capacity` kept texts fit in the ring of sketches
+        kept = np.flatnonzero(~near)[-self.capacity:]
+        slots = (np.arange(self._kept, self._kept + len(kept)) % self.capacity).astype(np.uint32)
+        self._sketches[slots] = sketches[kept]
+        self._kept += len(kept)
+        for band in range(self.bands):
+            self._bands[band].add(keys[kept, band], slots)
+        return near
+
+    # Estimated Jaccard similarity from the share of agreeing 16-bit sketch
+    # values, less the share expected to agree by chance
+    @staticmethod
+    def _similarity(a, b):
+        return ((a == b).mean(axis=1) - SKETCH_COLLISION) / (1 - SKETCH_COLLISION)
@@ -0,0 +1,238 @@
+"""Headless analysis engine shared by the Streamlit UI and the command line.
+
+Every function returns plain JSON-serialisable dicts; nothing here imports
+Streamlit.
+"""
+import os
+import tempfile
+
+from ingest import FeedbackStream, find_text_columns, read_chunks, read_frame, read_header
+from profiling import stage
+from score_cache import CacheStats
+from sentiment import score_reviews, summarize
+from terms import TermCounter, review_words
+from trends import TrendAggregates
+from website import analyze_page, fetch_page
+
+REQUIRED_FIELDS = ("bakery_name", "bakery_location", "bakery_type", "products")
+
+
+def _source_name(source):
+    return getattr(source, "name", None) or os.fspath(source)
+
+
+def _pick_column(columns, column):
+    if column is not None:
+        if column not in columns:
+            raise ValueError(f"Column {column!r} not found")
+        return column
+    text_columns = find_text_columns(columns)
+    if not text_columns:
+        raise ValueError("No review columns found. Ensure your CSV has columns like 'review', 'feedback', or 'comments'.")
+    return text_columns[0]
+
+
+def analyze_website(url, cache=None, session=None):
+    page = fetch_page(url, session, cache)
+    result, _ = analyze_page(page, cache)
+    return {"url": url, "source": page.source, **result}
+
+
+def crawl_websites(urls, max_depth=1, max_pages=25, cache=None, on_page=None):
+    from crawler import Crawler
+
+    return Crawler(max_depth=max_depth, max_pages=max_pages, cache=cache).crawl(urls, on_page=on_page)
+
+
+def _score_column(reviews, cache, workers, index=None, dedupe=None):
+    reviews = reviews.dropna().astype(str)
+    if dedupe is not None:
+        reviews = reviews[dedupe.keep(reviews)]
+    stats = CacheStats()
+    scores = score_reviews(reviews, workers=workers, cache=cache, stats=stats)
+    words = review_words(reviews)
+    if index is not None:
+        index.add(reviews, scores, words)
+    return reviews, scores, {
+        "reviews": len(reviews),
+        "words": int(reviews.str.split().str.len().sum()),
+        "sentiment": summarize(scores),
+        "frequencies": TermCounter().update(reviews, words).most_common(),
+        "cache": {"hits": stats.hits, "lookups": stats.lookups},
+    }
+
+
+# Sentiment, word count and word frequencies for a Series of reviews
+def analyze_reviews(reviews, cache=None, workers=None):
+    return _score_column(reviews, cache, workers)[2]
+
+
+# Day sums to continue from: those saved for this file, or for the file it
+# extends with appended rows. Returns (trend, rows already in it, key to save under).
+def _start_trend(source, column, date_column, trends, dedupe):
+    if trends is None:
+        return TrendAggregates(), 0, None
+    # Dropping duplicates changes which reviews are counted
+    variant = f"dedupe={dedupe.threshold}" if dedupe is not None else ""
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as fh:
+            found, key = trends.find(fh, column, date_column, variant)
+    else:
+        found, key = trends.find(source, column, date_column, variant)
+    if found is None:
+        return TrendAggregates(), 0, key
+    rows, trend = found
+    return trend, rows, key
+
+
+def _finish_trend(trend, date_column, reused, rows, trends, key):
+    if trends is not None:
+        trends.save(key, rows, trend)
+    return {"date_column": date_column, "reused_rows": reused, **trend.to_dict()}
+
+
+# Analyze one review column of a CSV, Parquet or Feather file. Only the review
+# (and date) column is read; "missing" counts empty reviews. Streaming mode
+# keeps memory flat for files of any size.
+# With a date column the result also has per-day sentiment sums under "trend";
+# a TrendStore lets a file with appended rows bucket only the new rows.
+# With `index_dir`, a TermIndex of the reviews is written there and described under "index".
+# With a `dedupe` similarity threshold (see dedupe.py; 1.0 for exact duplicates
+# only), one review per group of duplicates is scored and counted, and the
+# numbers left out are under "duplicates".
+def analyze_csv(source, column=None, streaming=False, cache=None, workers=None, on_chunk=None,
+                date_column=None, trends=None, index_dir=None, dedupe=None):
+    index = None
+    if index_dir:
+        from term_index import TermIndexBuilder
+
+        index = TermIndexBuilder(index_dir)
+    if dedupe is not None:
+        from dedupe import Deduplicator
+
+        dedupe = Deduplicator(dedupe)
+    try:
+        result = _analyze_csv(source, column, streaming, cache, workers, on_chunk, date_column, trends, index,
+                              dedupe)
+    except BaseException:
+        if index is not None:
+            index.discard()
+        raise
+    if index is not None:
+        result["index"] = index.save()
+    if dedupe is not None:
+        result["duplicates"] = {"exact": dedupe.exact, "near": dedupe.near, "threshold": dedupe.threshold}
+    return result
+
+
+def _analyze_csv(source, column, streaming, cache, workers, on_chunk, date_column, trends, index, dedupe):
+    header = read_header(source)
+    column = _pick_column(header, column)
+    if date_column is not None:
+        _pick_column(header, date_column)
+    if streaming:
+        trend, reused, key = (_start_trend(source, column, date_column, trends, dedupe) if date_column
+                              else (None, 0, None))
+        stream = FeedbackStream(source, column, cache=cache, workers=workers, date_column=date_column,
+                                trend=trend, trend_from=reused, index=index, dedupe=dedupe).run(on_chunk=on_chunk)
+        result = {
+            "file": _source_name(source),
+            "rows": stream.rows,
+            "columns": len(header),
+            "missing": stream.missing,
+            "column": column,
+            "reviews": stream.sentiment.reviews,
+            "words": stream.words,
+            "sentiment": stream.sentiment.summary(),
+            "frequencies": stream.terms.most_common(),
+            "cache": {"hits": stream.cache_stats.hits, "lookups": stream.cache_stats.lookups},
+        }
+        if date_column:
+            result["trend"] = _finish_trend(trend, date_column, reused, stream.rows, trends, key)
+        return result
+
+    with stage("ingest", unit="rows") as timed:
+        df = read_frame(source, [column] + ([date_column] if date_column else []), text_columns=[column])
+        timed.size = len(df)
+    reviews, scores, metrics = _score_column(df[column], cache, workers, index, dedupe)
+    result = {
+        "file": _source_name(source),
+        "rows": len(df),
+        "columns": len(header),
+        "missing": int(df[column].isna().sum()),
+        "column": column,
+        **metrics,
+    }
+    if date_column:
+        trend, reused, key = _start_trend(source, column, date_column, trends, dedupe)
+        new = reviews.index >= reused
+        trend.add(df[date_column].loc[reviews.index[new]], scores[new])
+        result["trend"] = _finish_trend(trend, date_column, reused, len(df), trends, key)
+    return result
+
+
+# Progressive estimate of one review column (see progressive.py). Reviews are
+# scored in a seeded random order, round by round; after each round
+# `on_round(result)` gets the metrics of the reviews scored so far, with
+# confidence intervals for the whole file under "estimate". The last round has
+# scored every review, so the returned result is exact. Duplicates are not
+# skipped, and no trend or term index is built.
+def analyze_csv_progressive(source, column=None, cache=None, workers=None, on_round=None, seed=0):
+    from progressive import SampleEstimate, ShuffledSpill, rounds
+
+    header = read_header(source)
+    column = _pick_column(header, column)
+    with tempfile.TemporaryDirectory(prefix="progressive-") as folder:
+        spill = ShuffledSpill(folder, seed=seed)
+        rows = 0
+        with stage("ingest", unit="rows") as timed:
+            for chunk in read_chunks(source, [column], text_columns=[column]):
+                rows += len(chunk)
+                spill.add(chunk[column].dropna().astype(str))
+            timed.size = rows
+        estimate, terms, stats = SampleEstimate(spill.size), TermCounter(), CacheStats()
+        result = {
+            "file": _source_name(source),
+            "rows": rows,
+            "columns": len(header),
+            "missing": rows - spill.size,
+            "column": column,
+            "reviews": 0,
+            "words": 0,
+            **_estimate_metrics(estimate, terms, stats),
+        }
+        for sample in spill.samples(rounds(spill.size)):
+            estimate.add(score_reviews(sample, workers=workers, cache=cache, stats=stats))
+            terms.update(sample)
+            result["reviews"] = estimate.sampled
+            result["words"] += int(sample.str.split().str.len().sum())
+            result.update(_estimate_metrics(estimate, terms, stats))
+            if on_round is not None:
+                on_round(result)
+    return result
+
+
+def _estimate_metrics(estimate, terms, stats):
+    return {
+        "sentiment": estimate.totals.summary(),
+        "frequencies": terms.most_common(),
+        "cache": {"hits": stats.hits, "lookups": stats.lookups},
+        "estimate": estimate.to_dict(),
+    }
+
+
+# Names of required submission fields that are empty
+def validate_submission(submission):
+    return [field for field in REQUIRED_FIELDS if not submission.get(field)]
+
+
+def analyze_submission(submission):
+    missing = validate_submission(submission)
+    if missing:
+        raise ValueError(f"Missing required fields: {', '.join(missing)}")
+    return {
+        "bakery_name": submission["bakery_name"],
+        "products_listed": len(submission["products"].split(",")),
+        "rating": submission.get("rating"),
+        "years_operation": submission.get("years_operation", 0),
+    }
@@ -0,0 +1,61 @@
+"""Fast visible-text extraction that never builds a DOM."""
+import re
+from html.parser import HTMLParser
+
+# Elements whose content is never shown to visitors
+SKIP_TAGS = frozenset({"script", "style", "noscript", "template"})
+CHARSET_RE = re.compile(rb"""<meta[^>]+charset=["']?([\w-]+)""", re.IGNORECASE)
+
+
+# Decode page bytes using the HTTP charset, then a <meta> charset, then UTF-8
+def decode_html(content, content_type=""):
+    charset = None
+    match = re.search(r"charset=([\w-]+)", content_type or "", re.IGNORECASE)
+    if match:
+        charset = match.group(1)
+    else:
+        match = CHARSET_RE.search(content[:4096])
+        if match:
+            charset = match.group(1).decode("ascii")
+    try:
+        return content.decode(charset or "utf-8", errors="replace")
+    except LookupError:
+        return content.decode("utf-8", errors="replace")
+
+
+class TextExtractor(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts = []
+        self.hrefs = []
+        self._skip = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIP_TAGS:
+            self._skip += 1
+        elif tag == "a":
+            for name, value in attrs:
+                if name == "href" and value:
+                    self.hrefs.append(value)
+
+    def handle_startendtag(self, tag, attrs):
+        if tag == "a":
+            self.handle_starttag(tag, attrs)
+
+    def handle_endtag(self, tag):
+        if tag in SKIP_TAGS and self._skip:
+            self._skip -= 1
+
+    def handle_data(self, data):
+        if not self._skip:
+            data = data.strip()
+            if data:
+                self.parts.append(data)
+
+
+# Same output as BeautifulSoup's get_text(" ", strip=True) after dropping scripts and styles
+def extract_visible_text(html):
+    parser = TextExtractor()
+    parser.feed(html)
+    parser.close()
+    return " ".join(parser.parts), parser.hrefs
@@ -0,0 +1,175 @@
+"""On-disk HTTP response cache with ETag/Last-Modified revalidation.
+
+Bodies are stored once per content hash. Analysis results are keyed by that
+hash plus the lexicon version, so a 304 or an unchanged body skips parsing and
+scoring entirely.
+"""
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from runtime import cache_dir
+from website import Page, content_hash, fetch
+
+# Seconds a response is served without asking the server again
+DEFAULT_TTL = 3600
+MAX_BYTES = 500 * 1024 * 1024
+
+
+# TTL from Cache-Control, or None when the response must not be stored
+def _ttl(headers, default):
+    cache_control = headers.get("Cache-Control", "").lower()
+    if "no-store" in cache_control:
+        return None
+    if "no-cache" in cache_control:
+        return 0
+    match = re.search(r"max-age=(\d+)", cache_control)
+    return int(match.group(1)) if match else default
+
+
+class HttpCache:
+    def __init__(self, path=None, ttl=DEFAULT_TTL, max_bytes=MAX_BYTES):
+        self.path = path or os.path.join(cache_dir(), "http")
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        os.makedirs(os.path.join(self.path, "bodies"), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(self.path, "index.sqlite"), timeout=30,
+                                   check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                url TEXT PRIMARY KEY, final_url TEXT, content_type TEXT, etag TEXT,
+                last_modified TEXT, body_hash TEXT, size INTEGER, expires REAL, used REAL
+            );
+            CREATE INDEX IF NOT EXISTS responses_used ON responses(used);
+            CREATE TABLE IF NOT EXISTS page_analyses (key TEXT PRIMARY KEY, result TEXT);
+            """
+        )
+        self._db.commit()
+
+    def _body_path(self, body_hash):
+        return os.path.join(self.path, "bodies", body_hash)
+
+    def _row(self, url):
+        with self._lock:
+            return self._db.execute(
+                "SELECT final_url, content_type, etag, last_modified, body_hash, expires "
+                "FROM responses WHERE url = ?", (url,)
+            ).fetchone()
+
+    def _read(self, url, row, source):
+        final_url, content_type, _, _, body_hash, _ = row
+        try:
+            with open(self._body_path(body_hash), "rb") as fh:
+                content = fh.read()
+        except FileNotFoundError:
+            return None
+        with self._lock:
+            self._db.execute("UPDATE responses SET used = ? WHERE url = ?", (time.time(), url))
+            self._db.commit()
+        return Page(final_url, content, content_type, body_hash, source)
+
+    # Cached page if it is still within its TTL, without touching the network
+    def fresh(self, url):
+        row = self._row(url)
+        if row is not None and row[5] > time.time():
+            return self._read(url, row, "cache")
+        return None
+
+    def fetch(self, url, session=None):
+        page = self.fresh(url)
+        if page is not None:
+            return page
+
+        row = self._row(url)
+        headers = {}
+        if row is not None:
+            if row[2]:
+                headers["If-None-Match"] = row[2]
+            if row[3]:
+                headers["If-Modified-Since"] = row[3]
+
+        response, body = fetch(url, session, headers=headers)
+        ttl = _ttl(response.headers, self.ttl)
+        if response.status_code == 304 and row is not None:
+            with self._lock:
+                self._db.execute(
+                    "UPDATE responses SET expires = ? WHERE url = ?", (time.time() + (ttl or 0), url)
+                )
+                self._db.commit()
+            page = self._read(url, row, "revalidated")
+            if page is not None:
+                return page
+            response, body = fetch(url, session)
+
+        page = Page(response.url, body, response.headers.get("Content-Type", ""),
+                    content_hash(body), "network")
+        if ttl is not None:
+            self._store(url, page, response.headers, ttl)
+        return page
+
+    def _store(self, url, page, headers, ttl):
+        body_path = self._body_path(page.content_hash)
+        if not os.path.exists(body_path):
+            tmp = f"{body_path}.{threading.get_ident()}.tmp"
+            with open(tmp, "wb") as fh:
+                fh.write(page.content)
+            os.replace(tmp, body_path)
+
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (url, page.url, page.content_type, headers.get("ETag"), headers.get("Last-Modified"),
+                 page.content_hash, len(page.content), now + ttl, now),
+            )
+            self._evict()
+            self._db.commit()
+
+    # Drop least-recently-used responses until the stored bodies fit in max_bytes
+    def _evict(self):
+        (total,) = self._db.execute(
+            "SELECT coalesce(sum(size), 0) FROM (SELECT DISTINCT body_hash, size FROM responses)"
+        ).fetchone()
+        if total <= self.max_bytes:
+            return
+
+        for url, body_hash, size in self._db.execute(
+            "SELECT url, body_hash, size FROM responses ORDER BY used"
+        ).fetchall():
+            self._db.execute("DELETE FROM responses WHERE url = ?", (url,))
+            still_used = self._db.execute(
+                "SELECT 1 FROM responses WHERE body_hash = ? LIMIT 1", (body_hash,)
+            ).fetchone()
+            if not still_used:
+                self._db.execute("DELETE FROM page_analyses WHERE key LIKE ?", (body_hash + "-%",))
+                try:
+                    os.remove(self._body_path(body_hash))
+                except FileNotFoundError:
+                    pass
+                total -= size
+                if total <= self.max_bytes:
+                    break
+
+    # Analyses are keyed "<body hash>-<analysis version>"
+    def get_analysis(self, key):
+        with self._lock:
+            row = self._db.execute("SELECT result FROM page_analyses WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    # Only kept while a stored response still holds the body, so eviction drops
+    # it with the body and no-store pages never leave an analysis behind
+    def put_analysis(self, key, analysis):
+        body_hash = key.split("-", 1)[0]
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO page_analyses SELECT ?, ? "
+                "WHERE EXISTS (SELECT 1 FROM responses WHERE body_hash = ?)",
+                (key, json.dumps(analysis), body_hash),
+            )
+            self._db.commit()
@@ -0,0 +1,220 @@
+"""Feedback file loading and chunked ingestion.
+
+CSV, Parquet and Feather (Arrow IPC) files are told apart by their first
+bytes. Only the columns an analysis needs are read: review text as
+Arrow-backed strings, and other low-cardinality text as categoricals.
+Parquet and Feather files on disk are memory-mapped. In streaming mode memory
+stays bounded by the chunk size, not the file size.
+"""
+import os
+
+import pandas as pd
+
+from profiling import stage
+from score_cache import CacheStats
+from sentiment import SentimentTotals, score_reviews
+from terms import TermCounter, review_words
+
+CHUNK_ROWS = 50000
+# Uploads larger than this default to streaming mode in the CSV tab
+STREAMING_THRESHOLD = 50 * 1024 * 1024
+REVIEW_KEYWORDS = ("review", "feedback", "comment", "text")
+FILE_TYPES = ("csv", "parquet", "feather")
+_MAGIC = {b"PAR1": "parquet", b"ARROW1": "feather"}
+ARROW_STRING = pd.StringDtype("pyarrow")
+# Text columns with at most this share of distinct values load as categoricals
+CATEGORY_SHARE = 0.5
+
+
+# Columns that look like free-text customer feedback
+def find_text_columns(columns):
+    return [col for col in columns if any(keyword in str(col).lower() for keyword in REVIEW_KEYWORDS)]
+
+
+def _rewind(source):
+    if hasattr(source, "seek"):
+        source.seek(0)
+    return source
+
+
+def _is_path(source):
+    return isinstance(source, (str, os.PathLike))
+
+
+# "csv", "parquet" or "feather", from the file's magic bytes
+def file_format(source):
+    if _is_path(source):
+        with open(source, "rb") as fh:
+            head = fh.read(6)
+    else:
+        head = _rewind(source).read(6)
+        _rewind(source)
+    for magic, name in _MAGIC.items():
+        if head.startswith(magic):
+            return name
+    return "csv"
+
+
+# Arrow input for a path (memory-mapped) or an open file
+def _arrow_input(source):
+    import pyarrow as pa
+
+    return pa.memory_map(os.fspath(source)) if _is_path(source) else _rewind(source)
+
+
+def _parquet(source):
+    import pyarrow.parquet as pq
+
+    return pq.ParquetFile(_arrow_input(source))
+
+
+def _feather(source):
+    import pyarrow as pa
+
+    return pa.ipc.open_file(_arrow_input(source))
+
+
+# Column names, without reading any rows
+def read_header(source):
+    kind = file_format(source)
+    if kind == "parquet":
+        return _parquet(source).schema_arrow.names
+    if kind == "feather":
+        return _feather(source).schema.names
+    return list(pd.read_csv(_rewind(source), nrows=0).columns)
+
+
+# Row count from the file's metadata; None for CSV, which has to be read to know
+def count_rows(source):
+    kind = file_format(source)
+    if kind == "parquet":
+        return _parquet(source).metadata.num_rows
+    if kind == "feather":
+        reader = _feather(source)
+        return sum(reader.get_batch(i).num_rows for i in range(reader.num_record_batches))
+    return None
+
+
+# First rows of the file without reading the rest of it
+def read_preview(source, rows=3):
+    kind = file_format(source)
+    if kind == "parquet":
+        batch = next(_parquet(source).iter_batches(batch_size=rows), None)
+        return batch.to_pandas() if batch is not None else pd.DataFrame(columns=read_header(source))
+    if kind == "feather":
+        reader = _feather(source)
+        if not reader.num_record_batches:
+            return pd.DataFrame(columns=reader.schema.names)
+        return reader.get_batch(0).slice(0, rows).to_pandas()
+    return pd.read_csv(_rewind(source), nrows=rows)
+
+
+# Low-cardinality text columns (other than `keep`) as categoricals
+def categorize(frame, keep=()):
+    for col in frame.columns:
+        values = frame[col]
+        if col not in keep and pd.api.types.is_string_dtype(values) and len(values) \
+                and values.nunique() <= CATEGORY_SHARE * len(values):
+            frame[col] = values.astype("category")
+    return frame
+
+
+# The given columns of the whole file; `text_columns` load as Arrow-backed
+# strings. CSV columns are all read as text, as in streaming mode.
+def read_frame(source, columns, text_columns=()):
+    kind = file_format(source)
+    if kind == "csv":
+        frame = pd.read_csv(_rewind(source), usecols=columns, engine="pyarrow",
+                            dtype={col: ARROW_STRING for col in columns})
+    else:
+        table = _parquet(source).read(columns=columns) if kind == "parquet" \
+            else _feather(source).read_all().select(columns)
+        frame = table.to_pandas()
+        for col in text_columns:
+            frame[col] = frame[col].astype(ARROW_STRING)
+    return categorize(frame[columns], keep=text_columns)
+
+
+# DataFrames of up to `chunk_rows` rows holding `columns`. The row index keeps
+# counting across chunks, so it is the row number in the file.
+def read_chunks(source, columns, chunk_rows=CHUNK_ROWS, text_columns=()):
+    kind = file_format(source)
+    if kind == "csv":
+        yield from pd.read_csv(_rewind(source), usecols=columns, chunksize=chunk_rows,
+                               dtype={col: ARROW_STRING for col in text_columns})
+        return
+    if kind == "parquet":
+        batches = _parquet(source).iter_batches(batch_size=chunk_rows, columns=columns)
+    else:
+        reader = _feather(source)
+        batches = (reader.get_batch(i).select(columns).slice(start, chunk_rows)
+                   for i in range(reader.num_record_batches)
+                   for start in range(0, reader.get_batch(i).num_rows, chunk_rows))
+    start = 0
+    for batch in batches:
+        chunk = batch.to_pandas()
+        chunk.index = pd.RangeIndex(start, start + len(chunk))
+        start += len(chunk)
+        yield chunk[columns]
+
+
+# Running file metrics, sentiment aggregates and word counts for one review column
+class FeedbackStream:
+    # With a date column, reviews from row `trend_from` on are added to `trend`.
+    # With a TermIndexBuilder, every review is added to `index`. With a
+    # Deduplicator, duplicate reviews are dropped before scoring.
+    def __init__(self, source, column, chunk_rows=CHUNK_ROWS, cache=None, workers=None,
+                 date_column=None, trend=None, trend_from=0, index=None, dedupe=None):
+        self.source = source
+        self.column = column
+        self.index = index
+        self.dedupe = dedupe
+        self.date_column = date_column
+        self.trend = trend
+        self.trend_from = trend_from
+        self.chunk_rows = chunk_rows
+        self.cache = cache
+        self.workers = workers
+        self.cache_stats = CacheStats()
+        self.rows = 0
+        self.missing = 0
+        self.words = 0
+        self.sentiment = SentimentTotals()
+        self.terms = TermCounter()
+
+    # Chunks of the review (and date) column, each read timed as an "ingest" stage
+    def _chunks(self):
+        columns = [self.column] + ([self.date_column] if self.date_column else [])
+        reader = read_chunks(self.source, columns, self.chunk_rows, text_columns=[self.column])
+        while True:
+            with stage("ingest", unit="rows") as timed:
+                chunk = next(reader, None)
+                timed.size = 0 if chunk is None else len(chunk)
+            if chunk is None:
+                return
+            yield chunk
+
+    def run(self, on_chunk=None):
+        for chunk in self._chunks():
+            self.rows += len(chunk)
+            self.missing += int(chunk[self.column].isna().sum())
+
+            reviews = chunk[self.column].dropna().astype(str)
+            if self.dedupe is not None:
+                reviews = reviews[self.dedupe.keep(reviews)]
+            scores = score_reviews(reviews, workers=self.workers, cache=self.cache, stats=self.cache_stats)
+            self.sentiment.add(scores)
+            if self.trend is not None:
+                # Chunks keep counting the row index, so it doubles as the file row number
+                new = reviews.index >= self.trend_from
+                if new.any():
+                    self.trend.add(chunk[self.date_column].loc[reviews.index[new]], scores[new])
+            self.words += int(reviews.str.split().str.len().sum())
+            words = review_words(reviews)
+            self.terms.update(reviews, words)
+            if self.index is not None:
+                self.index.add(reviews, scores, words)
+
+            if on_chunk is not None:
+                on_chunk(self)
+        return self
@@ -0,0 +1,402 @@
+"""Background analysis jobs that outlive the Streamlit run that started them.
+
+Jobs run in a pool of worker processes. Status, progress and results live in
+a SQLite store shared by every session, so a rerun, a page reload or another
+browser can reattach to a running or finished job by its id.
+"""
+import hashlib
+import json
+import multiprocessing
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from runtime import cache_dir
+
+# Analyses running at once; each one still scores reviews on its own share of the cores
+JOB_WORKERS = 2
+# Finished jobs kept for reattaching; older ones and their inputs are removed
+MAX_JOBS = 200
+# Seconds between progress writes from a worker
+PROGRESS_INTERVAL = 0.25
+# Most frequent words in the running totals of a streaming analysis
+PARTIAL_TERMS = 10
+ACTIVE = ("queued", "running")
+
+
+class JobCancelled(Exception):
+    pass
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class JobStore:
+    def __init__(self, path=None):
+        self.path = path or os.path.join(cache_dir(), "jobs.sqlite")
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                label TEXT NOT NULL,
+                status TEXT NOT NULL,
+                progress REAL NOT NULL DEFAULT 0,
+                message TEXT NOT NULL DEFAULT '',
+                params TEXT NOT NULL,
+                result TEXT,
+                error TEXT,
+                owner INTEGER NOT NULL,
+                cancel INTEGER NOT NULL DEFAULT 0,
+                created REAL NOT NULL,
+                updated REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS jobs_created ON jobs(created);
+            """
+        )
+        self._db.commit()
+
+    def _write(self, sql, args):
+        with self._lock, self._db:
+            return self._db.execute(sql, args)
+
+    def create(self, job_id, kind, label, params):
+        now = time.time()
+        self._write(
+            "INSERT INTO jobs (id, kind, label, status, params, owner, created, updated) "
+            "VALUES (?, ?, ?, 'queued', ?, ?, ?, ?)",
+            (job_id, kind, label, json.dumps(params), os.getpid(), now, now),
+        )
+
+    # Record progress, and with `result` a partial result shown while the job
+    # runs and kept if it is stopped; True when someone asked for the job to stop
+    def progress(self, job_id, fraction, message, result=None):
+        self._write(
+            "UPDATE jobs SET status = 'running', progress = ?, message = ?, result = COALESCE(?, result), "
+            "updated = ? WHERE id = ?",
+            (min(max(fraction, 0.0), 1.0), message, None if result is None else json.dumps(result), time.time(),
+             job_id),
+        )
+        with self._lock:
+            (cancel,) = self._db.execute("SELECT cancel FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return bool(cancel)
+
+    # Move an unfinished job to a final status; without a result, a partial
+    # result recorded by progress() is kept
+    def finish(self, job_id, status, result=None, error=None):
+        self._write(
+            "UPDATE jobs SET status = ?, progress = CASE WHEN ? = 'done' THEN 1 ELSE progress END, "
+            "result = COALESCE(?, result), error = ?, updated = ? WHERE id = ? AND status IN ('queued', 'running')",
+            (status, status, None if result is None else json.dumps(result), error, time.time(), job_id),
+        )
+
+    # Newest finished job of this kind with the given result key
+    def find_done(self, kind, key):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT id FROM jobs WHERE kind = ? AND status = 'done' AND json_extract(params, '$.key') = ? "
+                "ORDER BY created DESC LIMIT 1", (kind, key),
+            ).fetchone()
+        return row[0] if row else None
+
+    def request_cancel(self, job_id):
+        self._write("UPDATE jobs SET cancel = 1 WHERE id = ?", (job_id,))
+
+    def get(self, job_id):
+        with self._lock:
+            self._db.row_factory = sqlite3.Row
+            row = self._db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            self._db.row_factory = None
+        if row is None:
+            return None
+        job = dict(row)
+        job["params"] = json.loads(job["params"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    # Newest jobs of the given kinds, without their results
+    def recent(self, kinds, limit=20):
+        marks = ",".join("?" * len(kinds))
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT id, kind, label, status, progress, created FROM jobs WHERE kind IN ({marks}) "
+                "ORDER BY created DESC LIMIT ?", (*kinds, limit),
+            ).fetchall()
+        return [dict(zip(("id", "kind", "label", "status", "progress", "created"), row)) for row in rows]
+
+    # Jobs left unfinished by a server process that is gone
+    def interrupt_orphans(self):
+        with self._lock:
+            rows = self._db.execute("SELECT id, owner FROM jobs WHERE status IN ('queued', 'running')").fetchall()
+        for job_id, owner in rows:
+            if owner != os.getpid() and not _alive(owner):
+                self.finish(job_id, "failed", error="Interrupted by a server restart")
+
+    # Drop the oldest finished jobs beyond `keep`; returns their ids
+    def prune(self, keep=MAX_JOBS):
+        with self._lock, self._db:
+            ids = [row[0] for row in self._db.execute(
+                "SELECT id FROM jobs WHERE status NOT IN ('queued', 'running') "
+                "ORDER BY created DESC LIMIT -1 OFFSET ?", (keep,),
+            )]
+            self._db.executemany("DELETE FROM jobs WHERE id = ?", [(i,) for i in ids])
+        return ids
+
+
+def inputs_dir():
+    path = os.path.join(cache_dir(), "jobs")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+# Term index of a CSV job's reviews, kept as long as the job is
+def index_dir(job_id):
+    return os.path.join(cache_dir(), "indexes", job_id)
+
+
+# Calls report(fraction, message) at most every PROGRESS_INTERVAL seconds and
+# raises JobCancelled once the job has been cancelled. A `result` passed along
+# is stored as the job's partial result.
+class _Progress:
+    def __init__(self, store, job_id):
+        self.store = store
+        self.job_id = job_id
+        self.last = 0.0
+
+    def __call__(self, fraction, message, force=False, result=None):
+        now = time.monotonic()
+        if force or now - self.last >= PROGRESS_INTERVAL:
+            self.last = now
+            if self.store.progress(self.job_id, fraction, message, result):
+                raise JobCancelled()
+
+
+def _website(params, progress):
+    from engine import analyze_website
+    from http_cache import HttpCache
+
+    progress(0.1, f"Fetching {params['url']}", force=True)
+    return analyze_website(params["url"], cache=HttpCache())
+
+
+def _crawl(params, progress):
+    from engine import crawl_websites
+    from http_cache import HttpCache
+
+    urls = [u for u in params["urls"] if u.strip()]
+    budget = max(len(urls) * params["max_pages"], 1)
+    fetched = []
+
+    def on_page(site, page):
+        fetched.append(page)
+        progress(min(len(fetched) / budget, 0.99), f"Fetched {len(fetched)} pages — latest: {page['url']}")
+
+    progress(0.0, "Starting crawl", force=True)
+    reports = crawl_websites(urls, max_depth=params["depth"], max_pages=params["max_pages"],
+                             cache=HttpCache(), on_page=on_page)
+    return {"reports": reports}
+
+
+def _csv(params, progress):
+    from engine import analyze_csv, analyze_csv_progressive
+    from ingest import count_rows
+    from score_cache import ScoreCache
+    from sentiment import default_workers
+    from submissions import SubmissionStore
+    from trends import TrendStore
+
+    path = params["path"]
+    size = max(os.path.getsize(path), 1)
+    workers = max(1, default_workers() // JOB_WORKERS)
+    # Parquet and Feather are memory-mapped from the path and know their row count
+    total = count_rows(path)
+    with open(path, "rb") as fh:
+        source = fh if total is None else path
+        if params.get("progressive"):
+            # Each round's estimate is stored with the job, so stopping it keeps the latest one
+            def on_round(partial):
+                estimate = partial["estimate"]
+                progress(estimate["sampled"] / max(estimate["population"], 1),
+                         f"Scored {estimate['sampled']:,} of {estimate['population']:,} reviews in random order",
+                         force=True, result={**partial, "file": params["name"]})
+
+            progress(0.0, "Reading reviews...", force=True)
+            result = analyze_csv_progressive(source, params["column"], cache=ScoreCache(), workers=workers,
+                                             on_round=on_round)
+        elif params["streaming"]:
+            # Running totals are stored with the job, so they show while it runs
+            def on_chunk(stream):
+                done = fh.tell() / size if total is None else stream.rows / max(total, 1)
+                progress(min(done, 0.99), f"Processed {stream.rows:,} rows", result={
+                    "partial": True,
+                    "file": params["name"],
+                    "rows": stream.rows,
+                    "missing": stream.missing,
+                    "sentiment": stream.sentiment.summary(),
+                    "frequencies": stream.terms.most_common(PARTIAL_TERMS),
+                })
+
+            progress(0.0, "Reading file in chunks...", force=True)
+            result = analyze_csv(source, params["column"], streaming=True, cache=ScoreCache(), workers=workers,
+                                 on_chunk=on_chunk, date_column=params.get("date_column"), trends=TrendStore(),
+                                 index_dir=index_dir(params["job_id"]), dedupe=params.get("dedupe"))
+        else:
+            progress(0.0, "Scoring reviews...", force=True)
+            result = analyze_csv(source, params["column"], cache=ScoreCache(), workers=workers,
+                                 date_column=params.get("date_column"), trends=TrendStore(),
+                                 index_dir=index_dir(params["job_id"]), dedupe=params.get("dedupe"))
+    result["file"] = params["name"]
+
+    SubmissionStore().record_reviews(result["reviews"])
+    if params.get("bakery_type") and params.get("location") and result["reviews"]:
+        from percentiles import PercentileStore, benchmark
+
+        satisfaction = result["sentiment"]["satisfaction"]
+        result["benchmark"] = f"Satisfaction {satisfaction}%. " + benchmark(
+            PercentileStore(), "satisfaction", satisfaction, params["bakery_type"], params["location"])
+    return result
+
+
+RUNNERS = {"website": _website, "crawl": _crawl, "csv": _csv}
+
+
+def _remove_input(params):
+    if params.get("path"):
+        try:
+            os.remove(params["path"])
+        except FileNotFoundError:
+            pass
+
+
+# Runs once in each job worker process. Jobs may score with a pool of their
+# own (sentiment.py); it is shut down at worker exit, ahead of the pool
+# queues' own finalizers (priority 10), which would stop its shutdown
+# messages from ever reaching its workers.
+def _init_worker():
+    from multiprocessing import util
+
+    from sentiment import shutdown_pools
+
+    util.Finalize(None, shutdown_pools, exitpriority=100)
+
+
+# Runs in a worker process
+def _run_job(store_path, job_id, kind, params):
+    from profiling import recording
+
+    store = JobStore(store_path)
+    try:
+        progress = _Progress(store, job_id)
+        with recording(kind, params.get("profile", False), params.get("trace_memory", False)) as perf:
+            result = RUNNERS[kind]({**params, "job_id": job_id}, progress)
+        if perf is not None:
+            result["performance"] = perf.to_dict()
+        store.finish(job_id, "done", result)
+    except JobCancelled:
+        store.finish(job_id, "cancelled")
+    except Exception as e:
+        store.finish(job_id, "failed", error=str(e))
+    finally:
+        _remove_input(params)
+
+
+# Submits jobs to the worker pool. One per server process (see app.py).
+class JobManager:
+    def __init__(self, store=None, workers=JOB_WORKERS):
+        self.store = store or JobStore()
+        self.store.interrupt_orphans()
+        self.workers = workers
+        self._lock = threading.Lock()
+        self._pool = self._new_pool()
+        self._futures = {}
+
+    def _new_pool(self):
+        return ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"),
+                                   initializer=_init_worker)
+
+    # A worker killed mid-job (out of memory, say) breaks the whole pool; the
+    # first caller to notice swaps in a fresh one. Returns the current pool.
+    def _rebuild(self, broken):
+        with self._lock:
+            if self._pool is broken:
+                broken.shutdown(wait=False, cancel_futures=True)
+                self._pool = self._new_pool()
+            return self._pool
+
+    # Queue a job; `upload` is copied to disk first so the worker can read it.
+    # With the upload's content hash, a finished job with the same input and
+    # params is reused instead. Returns the job id.
+    def submit(self, kind, label, params, upload=None, content_hash=None):
+        params = dict(params)
+        if content_hash is not None:
+            params["key"] = hashlib.blake2b(json.dumps([content_hash, params], sort_keys=True).encode("utf-8"),
+                                            digest_size=16).hexdigest()
+            done = self.store.find_done(kind, params["key"])
+            if done is not None:
+                return done
+        job_id = uuid.uuid4().hex[:12]
+        if upload is not None:
+            params["path"] = os.path.join(inputs_dir(), f"{job_id}.input")
+            upload.seek(0)
+            with open(params["path"], "wb") as fh:
+                shutil.copyfileobj(upload, fh)
+        self.store.create(job_id, kind, label, params)
+        pool = self._pool
+        try:
+            try:
+                future = pool.submit(_run_job, self.store.path, job_id, kind, params)
+            except BrokenProcessPool:
+                pool = self._rebuild(pool)
+                future = pool.submit(_run_job, self.store.path, job_id, kind, params)
+        except Exception as e:
+            # Never leave a queued job that no worker will pick up
+            self.store.finish(job_id, "failed", error=str(e))
+            _remove_input(params)
+            raise
+        self._futures[job_id] = future
+        future.add_done_callback(lambda f: self._settle(job_id, f, pool))
+        for old in self.store.prune():
+            shutil.rmtree(index_dir(old), ignore_errors=True)
+        return job_id
+
+    # Covers jobs that never reached _run_job's own bookkeeping
+    def _settle(self, job_id, future, pool):
+        self._futures.pop(job_id, None)
+        if future.cancelled():
+            self.store.finish(job_id, "cancelled")
+        elif isinstance(future.exception(), BrokenProcessPool):
+            self._rebuild(pool)
+            self.store.finish(job_id, "failed", error="The analysis worker stopped unexpectedly, possibly out of "
+                                                       "memory. Try streaming mode for large files.")
+        elif future.exception() is not None:
+            self.store.finish(job_id, "failed", error=str(future.exception()))
+        else:
+            return
+        _remove_input(self.store.get(job_id)["params"])
+
+    def cancel(self, job_id):
+        future = self._futures.get(job_id)
+        if future is None or not future.cancel():
+            self.store.request_cancel(job_id)
+
+    def get(self, job_id):
+        return self.store.get(job_id)
+
+    def recent(self, kinds, limit=20):
+        return self.store.recent(kinds, limit)
@@ -0,0 +1,119 @@
+"""Single-pass bakery keyword matching against an external lexicon.
+
+The lexicon is a JSON object of categories. Each category is either a list of
+terms or an object that maps a canonical term to its synonyms:
+
+    {"Bakery Products": {"donut": ["doughnut"], "croissant": []},
+     "Quality Terms": ["fresh", "organic"]}
+
+Terms match on whole words only ("pie" does not match inside "piece"). Regular
+plurals match too, and terms may span several words ("cinnamon roll").
+"""
+import functools
+import hashlib
+import json
+import os
+import re
+from collections import Counter
+
+DEFAULT_LEXICON = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "bakery_lexicon.json")
+TOKEN_RE = re.compile(r"[^\W_]+")
+
+
+def lexicon_path():
+    return os.environ.get("BAKERY_LEXICON") or DEFAULT_LEXICON
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(text.lower())
+
+
+# Singular and regular plural spellings of a term's last word
+def _variants(tokens):
+    *head, last = tokens
+    forms = {last, last + "s", last + "es"}
+    if last.endswith("y") and len(last) > 2:
+        forms.add(last[:-1] + "ies")
+    return [tuple(head) + (form,) for form in forms]
+
+
+class KeywordMatcher:
+    def __init__(self, lexicon):
+        # token tuple -> [(category, canonical term)]
+        self.terms = {}
+        # first token -> phrase lengths starting with it, longest first
+        self.starts = {}
+        self.categories = list(lexicon)
+        self.version = None
+
+        for category, entries in lexicon.items():
+            if not isinstance(entries, dict):
+                entries = {term: [] for term in entries}
+            for canonical, synonyms in entries.items():
+                for spelling in [canonical, *synonyms]:
+                    tokens = tokenize(spelling)
+                    if not tokens:
+                        continue
+                    for phrase in _variants(tokens):
+                        targets = self.terms.setdefault(phrase, [])
+                        if (category, canonical) not in targets:
+                            targets.append((category, canonical))
+
+        lengths = {}
+        for phrase in self.terms:
+            lengths.setdefault(phrase[0], set()).add(len(phrase))
+        self.starts = {token: sorted(ls, reverse=True) for token, ls in lengths.items()}
+
+    # One left-to-right pass over the tokens. Work per token depends on phrase
+    # lengths, not lexicon size. The longest phrase wins, so "apple pie" is not
+    # also counted as "pie".
+    def scan(self, text):
+        tokens = tokenize(text)
+        categories = Counter()
+        terms = Counter()
+        i, n = 0, len(tokens)
+        while i < n:
+            step = 1
+            for length in self.starts.get(tokens[i], ()):
+                targets = self.terms.get(tuple(tokens[i:i + length]))
+                if targets is not None:
+                    for category, canonical in targets:
+                        categories[category] += 1
+                        terms[canonical] += 1
+                    step = length
+                    break
+            i += step
+        return categories, terms
+
+    # Every token sequence that counts as `term`: its regular plurals and, when
+    # it is a lexicon term or synonym, all spellings of that lexicon term
+    def spellings(self, term):
+        tokens = tokenize(term)
+        if not tokens:
+            return []
+        canonicals = {canonical for _, canonical in self.terms.get(tuple(tokens), ())}
+        if not canonicals:
+            return _variants(tokens)
+        return [phrase for phrase, targets in self.terms.items()
+                if any(canonical in canonicals for _, canonical in targets)]
+
+    # Matches per category, omitting categories with no hits
+    def count(self, text):
+        categories, _ = self.scan(text)
+        return {category: categories[category] for category in self.categories if categories[category]}
+
+
+@functools.lru_cache(maxsize=4)
+def _load(path, mtime):
+    with open(path, "rb") as fh:
+        raw = fh.read()
+    matcher = KeywordMatcher(json.loads(raw))
+    # Identifies the lexicon contents, so cached analyses from an older lexicon are not reused
+    matcher.version = hashlib.blake2b(raw, digest_size=8).hexdigest()
+    return matcher
+
+
+# Compiled matcher for the configured lexicon, rebuilt when the file changes
+def get_matcher(path=None):
+    path = path or lexicon_path()
+    return _load(path, os.path.getmtime(path))
@@ -0,0 +1,217 @@
+"""Industry percentiles from mergeable streaming quantile sketches.
+
+Each (metric, bakery type, region) segment keeps a KLL sketch. A sketch holds
+O(k log n) values no matter how many results it has seen. Sketches serialise to
+plain dicts, so sketches built on separate batch workers can be merged.
+"""
+import bisect
+import json
+import math
+import os
+import random
+import sqlite3
+import threading
+
+from runtime import data_dir
+
+ALL = "All"
+BAKERY_TYPES = ["Artisan", "Commercial", "Cafe", "Pastry Shop", "Home-based", "Other"]
+# Segments with fewer results than this are not worth a percentile claim
+MIN_PEERS = 5
+
+
+class KLLSketch:
+    def __init__(self, k=200, c=2 / 3, seed=None):
+        self.k = k
+        self.c = c
+        self.n = 0
+        self.compactors = [[]]
+        self._rng = random.Random(seed)
+        self._cdf = None
+        self._size = 0
+        self._max_size = self._capacity(0)
+
+    def _capacity(self, level):
+        depth = len(self.compactors) - level - 1
+        return max(2, int(math.ceil(self.k * self.c ** depth)))
+
+    def _resize(self):
+        self._size = sum(len(items) for items in self.compactors)
+        self._max_size = sum(self._capacity(level) for level in range(len(self.compactors)))
+
+    # Halve the lowest full level: sort it and promote every other item, so each
+    # promoted item stands for twice the weight
+    def _compress(self):
+        self._resize()
+        while self._size >= self._max_size:
+            for level, items in enumerate(self.compactors):
+                if len(items) >= self._capacity(level):
+                    if level + 1 == len(self.compactors):
+                        self.compactors.append([])
+                    items.sort()
+                    keep = [items.pop()] if len(items) % 2 else []
+                    offset = self._rng.random() < 0.5
+                    self.compactors[level + 1].extend(items[offset::2])
+                    self.compactors[level] = keep
+                    self._resize()
+                    break
+
+    def update(self, value):
+        self.compactors[0].append(float(value))
+        self.n += 1
+        self._size += 1
+        self._cdf = None
+        if self._size >= self._max_size:
+            self._compress()
+
+    def merge(self, other):
+        while len(self.compactors) < len(other.compactors):
+            self.compactors.append([])
+        for level, items in enumerate(other.compactors):
+            self.compactors[level].extend(items)
+        self.n += other.n
+        self._cdf = None
+        self._compress()
+        return self
+
+    # Sorted values with cumulative weights, rebuilt only after updates
+    def _weighted(self):
+        if self._cdf is None:
+            pairs = sorted((value, 1 << level) for level, items in enumerate(self.compactors) for value in items)
+            values, cumulative, total = [], [], 0
+            for value, weight in pairs:
+                total += weight
+                values.append(value)
+                cumulative.append(total)
+            self._cdf = (values, cumulative, total)
+        return self._cdf
+
+    # Share of observed values below `value` (ties count half), from 0 to 100
+    def percentile_of(self, value):
+        values, cumulative, total = self._weighted()
+        if not total:
+            return None
+        lo = bisect.bisect_left(values, value)
+        hi = bisect.bisect_right(values, value)
+        below = cumulative[lo - 1] if lo else 0
+        through = cumulative[hi - 1] if hi else 0
+        return 100.0 * (below + (through - below) / 2) / total
+
+    # Value at quantile q (0..1)
+    def quantile(self, q):
+        values, cumulative, total = self._weighted()
+        if not total:
+            return None
+        index = bisect.bisect_left(cumulative, q * total)
+        return values[min(index, len(values) - 1)]
+
+    def to_dict(self):
+        return {"k": self.k, "c": self.c, "n": self.n, "compactors": self.compactors}
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls(k=data["k"], c=data["c"])
+        sketch.n = data["n"]
+        sketch.compactors = [list(items) for items in data["compactors"]]
+        sketch._resize()
+        return sketch
+
+
+# "Pune, India" -> "Pune"
+def region_of(location):
+    return (location or "").split(",")[0].strip().title() or ALL
+
+
+# Each result also counts toward the type-wide, region-wide and overall segments
+def _segments(bakery_type, region):
+    return {(bakery_type, region), (bakery_type, ALL), (ALL, region), (ALL, ALL)}
+
+
+class PercentileStore:
+    def __init__(self, path=None, k=200):
+        self.path = path or os.path.join(data_dir(), "percentiles.sqlite")
+        self.k = k
+        self._lock = threading.Lock()
+        # (metric, type, region) -> (version, sketch) for sketches already deserialised
+        self._loaded = {}
+        self._db = sqlite3.connect(self.path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS sketches ("
+            "metric TEXT, bakery_type TEXT, region TEXT, version INTEGER, sketch TEXT, "
+            "PRIMARY KEY (metric, bakery_type, region))"
+        )
+
+    # Only the version is read while the deserialised sketch is still current
+    def _read(self, key):
+        where = "WHERE metric = ? AND bakery_type = ? AND region = ?"
+        row = self._db.execute(f"SELECT version FROM sketches {where}", key).fetchone()
+        if row is None:
+            return 0, KLLSketch(self.k)
+        cached = self._loaded.get(key)
+        if cached is not None and cached[0] == row[0]:
+            return cached
+        (data,) = self._db.execute(f"SELECT sketch FROM sketches {where}", key).fetchone()
+        loaded = (row[0], KLLSketch.from_dict(json.loads(data)))
+        self._loaded[key] = loaded
+        return loaded
+
+    # Read-modify-write every affected sketch in one write transaction, so
+    # concurrent processes never lose each other's updates
+    def _apply(self, changes):
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                for key, change in changes:
+                    version, sketch = self._read(key)
+                    change(sketch)
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO sketches VALUES (?, ?, ?, ?, ?)",
+                        (*key, version + 1, json.dumps(sketch.to_dict())),
+                    )
+                    self._loaded[key] = (version + 1, sketch)
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                self._loaded.clear()
+                raise
+
+    def observe(self, metric, bakery_type, region, value):
+        self._apply([((metric, t, r), lambda sketch: sketch.update(value))
+                     for t, r in _segments(bakery_type or ALL, region or ALL)])
+
+    # (percentile, peer count) of `value` within one segment; percentile is None below MIN_PEERS
+    def percentile(self, metric, bakery_type, region, value):
+        with self._lock:
+            _, sketch = self._read((metric, bakery_type or ALL, region or ALL))
+        if sketch.n < MIN_PEERS:
+            return None, sketch.n
+        return sketch.percentile_of(value), sketch.n
+
+    # Every sketch as plain data, for merging into another store
+    def export(self):
+        with self._lock:
+            rows = self._db.execute("SELECT metric, bakery_type, region, sketch FROM sketches").fetchall()
+        return [{"metric": m, "bakery_type": t, "region": r, "sketch": json.loads(s)} for m, t, r, s in rows]
+
+    def merge(self, exported):
+        self._apply([((e["metric"], e["bakery_type"], e["region"]),
+                      lambda sketch, e=e: sketch.merge(KLLSketch.from_dict(e["sketch"])))
+                     for e in exported])
+
+
+# Where `value` falls among earlier results for the same bakery type and city,
+# as a sentence; the value then counts toward those segments
+def benchmark(store, metric, value, bakery_type, location):
+    region = region_of(location)
+    percentile, peers = store.percentile(metric, bakery_type, region, value)
+    store.observe(metric, bakery_type, region, value)
+    if percentile is None:
+        return f"Not enough {bakery_type} bakeries in {region} yet for a percentile ({peers} so far)."
+    return f"That is the **{ordinal(percentile)} percentile** for {bakery_type} bakeries in {region} ({peers} compared)."
+
+
+def ordinal(n):
+    n = int(round(n))
+    suffix = "th" if 10 <= n % 100 <= 20 else {1: "st", 2: "nd", 3: "rd"}.get(n % 10, "th")
+    return f"{n}{suffix}"
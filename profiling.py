@@ -0,0 +1,249 @@
+"""Optional per-stage timing and memory instrumentation for the analysis hot paths.
+
+Hot paths wrap their work in ``stage(name, size, unit)``. Nothing is measured
+unless an analysis runs inside ``recording(...)``; outside of one, ``stage``
+costs a context-variable lookup and returns a shared no-op.
+
+Recording turns on with the UI's "Performance details" toggle or for every
+analysis when BAKERY_ANALYZER_METRICS names an output file:
+
+* ``*.prom``: Prometheus text format for the node_exporter textfile collector,
+  with counters summed across processes and restarts
+* anything else: one JSON line per analysis
+
+Each stage records wall time, CPU time of the calling thread, input size and
+how far it pushed the process's peak RSS. Exact peak Python allocations come
+from tracemalloc, which slows the analysis down several times, so they are
+only traced when asked for (BAKERY_ANALYZER_METRICS_MEMORY=1, or the UI option).
+Sentiment scoring in worker processes shows up in wall time, not CPU time.
+"""
+import contextlib
+import contextvars
+import functools
+import json
+import os
+import re
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+
+_recorder = contextvars.ContextVar("recorder", default=None)
+# Open stages on this thread, innermost last (only kept while tracing allocations)
+_open = contextvars.ContextVar("open_stages", default=())
+_export_lock = threading.Lock()
+
+
+def export_path():
+    return os.environ.get("BAKERY_ANALYZER_METRICS") or None
+
+
+def _trace_by_default():
+    return os.environ.get("BAKERY_ANALYZER_METRICS_MEMORY", "").lower() in ("1", "true", "yes")
+
+
+# High-water mark of this process's resident memory in bytes
+def _max_rss():
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return usage if sys.platform == "darwin" else usage * 1024
+
+
+class _Off:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    # Lets callers set `s.size = ...` without checking whether recording is on
+    def __setattr__(self, name, value):
+        pass
+
+
+_OFF = _Off()
+
+
+# Measure the enclosed block as one call of `name`. Set `.size` on the returned
+# object when the input size is only known inside the block.
+def stage(name, size=None, unit="bytes"):
+    recorder = _recorder.get()
+    if recorder is None:
+        return _OFF
+    return _Stage(recorder, name, size, unit)
+
+
+class _Stage:
+    def __init__(self, recorder, name, size, unit):
+        self.recorder = recorder
+        self.name = name
+        self.size = size
+        self.unit = unit
+        # Highest absolute allocation peak seen by nested stages
+        self.child_peak = 0
+
+    def __enter__(self):
+        if self.recorder.trace_memory:
+            current, peak = tracemalloc.get_traced_memory()
+            parents = _open.get()
+            if parents:
+                parents[-1].child_peak = max(parents[-1].child_peak, peak)
+            tracemalloc.reset_peak()
+            self.start_alloc = current
+            self._token = _open.set(parents + (self,))
+        self.start_rss = _max_rss()
+        self.start_cpu = time.thread_time()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        wall = time.perf_counter() - self.start
+        cpu = time.thread_time() - self.start_cpu
+        peak_alloc = None
+        if self.recorder.trace_memory:
+            _open.reset(self._token)
+            absolute = max(tracemalloc.get_traced_memory()[1], self.child_peak)
+            parents = _open.get()
+            if parents:
+                parents[-1].child_peak = max(parents[-1].child_peak, absolute)
+            peak_alloc = absolute - self.start_alloc
+        self.recorder.add(self.name, self.unit, self.size, wall, cpu, _max_rss() - self.start_rss, peak_alloc)
+        return False
+
+
+# Stage measurements of one analysis, merged per (stage, unit)
+class Recorder:
+    def __init__(self, analysis, trace_memory=False):
+        self.analysis = analysis
+        self.trace_memory = trace_memory
+        self.started = time.time()
+        self.wall = None
+        self.stages = {}
+        self._lock = threading.Lock()
+
+    def add(self, name, unit, size, wall, cpu, rss_growth, peak_alloc):
+        with self._lock:
+            entry = self.stages.setdefault((name, unit), {
+                "stage": name, "calls": 0, "wall_s": 0.0, "cpu_s": 0.0, "input": 0, "unit": unit,
+                "rss_growth_bytes": 0, "peak_alloc_bytes": None,
+            })
+            entry["calls"] += 1
+            entry["wall_s"] += wall
+            entry["cpu_s"] += cpu
+            entry["input"] += size or 0
+            entry["rss_growth_bytes"] += rss_growth
+            if peak_alloc is not None:
+                entry["peak_alloc_bytes"] = max(entry["peak_alloc_bytes"] or 0, peak_alloc)
+
+    # One dict per stage, in the order stages first ran
+    def summary(self):
+        with self._lock:
+            return [dict(entry) for entry in self.stages.values()]
+
+    def to_dict(self):
+        return {"analysis": self.analysis, "time": self.started, "wall_s": self.wall, "stages": self.summary()}
+
+
+# Record every stage run inside the block. Yields the Recorder, or None when
+# neither `enabled` nor an export file asks for metrics.
+@contextlib.contextmanager
+def recording(analysis, enabled=False, trace_memory=None):
+    path = export_path()
+    if not (enabled or path):
+        yield None
+        return
+
+    trace_memory = _trace_by_default() if trace_memory is None else trace_memory
+    started_tracing = trace_memory and not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    recorder = Recorder(analysis, trace_memory)
+    token = _recorder.set(recorder)
+    start = time.perf_counter()
+    try:
+        yield recorder
+    finally:
+        recorder.wall = time.perf_counter() - start
+        _recorder.reset(token)
+        if started_tracing:
+            tracemalloc.stop()
+        if path:
+            export(recorder, path)
+
+
+# `fn` bound to the current recording, for work handed to thread pools
+def propagate(fn):
+    if _recorder.get() is None:
+        return fn
+    return functools.partial(contextvars.copy_context().run, fn)
+
+
+def export(recorder, path):
+    with _export_lock:
+        if path.endswith(".prom"):
+            _write_prometheus(recorder, path)
+        else:
+            with open(path, "a", encoding="utf-8") as fh:
+                fh.write(json.dumps(recorder.to_dict()) + "\n")
+
+
+# name -> (type, help); counters accumulate, gauges hold the latest value
+PROMETHEUS_METRICS = {
+    "bakery_analyses_total": ("counter", "Analyses recorded."),
+    "bakery_analysis_seconds_total": ("counter", "Wall time of recorded analyses."),
+    "bakery_stage_calls_total": ("counter", "Stage executions."),
+    "bakery_stage_seconds_total": ("counter", "Wall time spent in each stage."),
+    "bakery_stage_cpu_seconds_total": ("counter", "CPU time of the calling thread in each stage."),
+    "bakery_stage_input_total": ("counter", "Input processed by each stage, in the unit label."),
+    "bakery_stage_rss_growth_bytes": ("gauge", "Peak RSS growth caused by the stage in the latest analysis."),
+    "bakery_stage_peak_alloc_bytes": ("gauge", "Peak traced allocation of the stage in the latest analysis."),
+}
+SAMPLE_RE = re.compile(r"^(\w+)(\{.*\})? (\S+)$")
+
+
+def _samples(recorder):
+    analysis = f'analysis="{recorder.analysis}"'
+    yield "bakery_analyses_total", f"{{{analysis}}}", 1
+    yield "bakery_analysis_seconds_total", f"{{{analysis}}}", recorder.wall
+    for entry in recorder.summary():
+        labels = f'{{{analysis},stage="{entry["stage"]}",unit="{entry["unit"]}"}}'
+        yield "bakery_stage_calls_total", labels, entry["calls"]
+        yield "bakery_stage_seconds_total", labels, entry["wall_s"]
+        yield "bakery_stage_cpu_seconds_total", labels, entry["cpu_s"]
+        yield "bakery_stage_input_total", labels, entry["input"]
+        yield "bakery_stage_rss_growth_bytes", labels, entry["rss_growth_bytes"]
+        if entry["peak_alloc_bytes"] is not None:
+            yield "bakery_stage_peak_alloc_bytes", labels, entry["peak_alloc_bytes"]
+
+
+# Add this analysis to the totals already in the file, under an exclusive lock
+# so several processes can share one file
+def _write_prometheus(recorder, path):
+    import fcntl
+
+    with open(path + ".lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        values = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as fh:
+                for line in fh:
+                    match = SAMPLE_RE.match(line.strip())
+                    if match:
+                        values[(match[1], match[2] or "")] = float(match[3])
+        for name, labels, value in _samples(recorder):
+            if PROMETHEUS_METRICS[name][0] == "counter":
+                value += values.get((name, labels), 0)
+            values[(name, labels)] = value
+
+        lines = []
+        for name, (kind, help_text) in PROMETHEUS_METRICS.items():
+            samples = sorted((labels, value) for (metric, labels), value in values.items() if metric == name)
+            if samples:
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+                lines += [f"{name}{labels} {float(value)!r}" for labels, value in samples]
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            fh.write("\n".join(lines) + "\n")
+        os.replace(tmp, path)
@@ -0,0 +1,149 @@
+"""Progressive sentiment estimates for quick triage of large feedback files.
+
+Reviews are scored in a random order: a seeded permutation of the file's
+non-empty reviews, so every prefix of it is a simple random sample drawn
+without replacement. The permutation is built without holding the column in
+memory: one chunked read deals each review into one of BUCKETS spill files
+at random, and the buckets are then read back one at a time and shuffled. After each round the headline metrics are estimated
+from the reviews scored so far, with normal-approximation confidence
+intervals. The finite population correction shrinks them as the sample
+covers more of the file; once every review is scored they close, and the
+estimate is the exact whole-file result.
+"""
+import math
+import os
+
+import numpy as np
+import pyarrow as pa
+
+from sentiment import NEG, NEU, POS, COMPOUND, POSITIVE_THRESHOLD, SentimentTotals
+
+CONFIDENCE = 0.95
+Z = 1.959963984540054
+# Reviews in the first round; later rounds double, up to LARGEST_ROUND
+FIRST_ROUND = 2000
+LARGEST_ROUND = 100_000
+# Spill files the reviews are dealt into; one of them is in memory at a time
+BUCKETS = 256
+
+
+# (start, stop) positions of each round over `population` reviews
+def rounds(population, first=FIRST_ROUND, largest=LARGEST_ROUND):
+    start, size = 0, first
+    while start < population:
+        stop = min(start + size, population)
+        yield start, stop
+        start, size = stop, min(size * 2, largest)
+
+
+# Half-width of the confidence interval for a population mean, from the sum
+# and sum of squares of a sample of n values out of `population`; None while
+# the sample is too small to tell
+def margin(total, squares, n, population, z=Z):
+    if n >= population:
+        return 0.0
+    if n < 2:
+        return None
+    variance = max(squares - total * total / n, 0.0) / (n - 1)
+    correction = (population - n) / (population - 1)
+    return z * math.sqrt(variance / n * correction)
+
+
+# Running sample sums; estimates the file's metrics from the reviews scored so far
+class SampleEstimate:
+    def __init__(self, population):
+        self.population = population
+        self.totals = SentimentTotals()
+        self.squares = np.zeros(4, dtype=np.float64)
+
+    @property
+    def sampled(self):
+        return self.totals.reviews
+
+    def add(self, scores):
+        self.totals.add(scores)
+        self.squares += np.square(scores, dtype=np.float64).sum(axis=0)
+        return self
+
+    # Sample means with the half-widths of their intervals under "margins".
+    # Shares are fractions; satisfaction is pos * 100 like summarize().
+    def to_dict(self):
+        n, population = self.sampled, self.population
+        sums, positive = self.totals.sums, self.totals.positive
+        margins = {field: margin(sums[col], self.squares[col], n, population)
+                   for field, col in (("neg", NEG), ("neu", NEU), ("pos", POS), ("compound", COMPOUND))}
+        # A 0/1 value's sum of squares is its sum
+        margins["positive_share"] = margin(positive, positive, n, population)
+        return {
+            "sampled": n,
+            "population": population,
+            "confidence": CONFIDENCE,
+            "exact": n >= population,
+            "positive_share": positive / n if n else 0.0,
+            "positive_threshold": POSITIVE_THRESHOLD,
+            "margins": margins,
+        }
+
+
+# Reviews in a seeded random order, spilled to `folder`. Dealing each review
+# into a random bucket and shuffling within buckets orders them by independent
+# random keys (bucket, then a random tiebreak): a uniform random permutation.
+class ShuffledSpill:
+    def __init__(self, folder, buckets=BUCKETS, seed=0):
+        self.rng = np.random.default_rng(seed)
+        self.paths = [os.path.join(folder, f"{i}.bin") for i in range(buckets)]
+        self._files = [open(path, "wb") for path in self.paths]
+        self.size = 0
+
+    # `texts` is a Series of strings. Each write to a bucket is a record:
+    # review count, byte lengths, then the UTF-8 texts back to back.
+    def add(self, texts):
+        labels = self.rng.integers(0, len(self.paths), len(texts))
+        order = np.argsort(labels, kind="stable")
+        array = pa.array(texts, type=pa.large_string()).take(order)
+        if isinstance(array, pa.ChunkedArray):
+            array = array.combine_chunks()
+        _, offsets, data = array.buffers()
+        offsets = np.frombuffer(offsets, dtype=np.int64)[:len(array) + 1]
+        data = memoryview(data if data is not None else b"")
+        bounds = np.searchsorted(labels[order], np.arange(len(self.paths) + 1))
+        for bucket in np.flatnonzero(np.diff(bounds)):
+            start, stop = bounds[bucket], bounds[bucket + 1]
+            fh = self._files[bucket]
+            np.array([stop - start], dtype=np.int64).tofile(fh)
+            np.diff(offsets[start:stop + 1]).tofile(fh)
+            fh.write(data[offsets[start]:offsets[stop]])
+        self.size += len(array)
+        return self
+
+    def _bucket(self, path):
+        parts = []
+        with open(path, "rb") as fh:
+            while len(count := np.fromfile(fh, dtype=np.int64, count=1)):
+                lengths = np.fromfile(fh, dtype=np.int64, count=int(count[0]))
+                offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+                np.cumsum(lengths, out=offsets[1:])
+                data = fh.read(int(offsets[-1]))
+                parts.append(pa.Array.from_buffers(pa.large_string(), len(lengths),
+                                                   [None, pa.py_buffer(offsets), pa.py_buffer(data)]))
+        os.remove(path)
+        array = pa.concat_arrays(parts) if parts else pa.array([], type=pa.large_string())
+        return array.take(self.rng.permutation(len(array)))
+
+    # For each (start, stop) of `bounds`, a Series of the next stop - start
+    # reviews in random order; only one bucket is read in at a time
+    def samples(self, bounds):
+        for fh in self._files:
+            fh.close()
+        buckets = (self._bucket(path) for path in self.paths)
+        pending = pa.array([], type=pa.large_string())
+        for start, stop in bounds:
+            parts, wanted = [], stop - start
+            while wanted:
+                if not len(pending):
+                    pending = next(buckets)
+                    continue
+                parts.append(pending[:wanted])
+                wanted -= len(parts[-1])
+                pending = pending[len(parts[-1]):]
+            yield pa.chunked_array(parts, type=pa.large_string()).to_pandas()
@@ -0,0 +1,387 @@
+"""PDF reports of website and customer feedback analyses.
+
+A report renders one analysis result (a CSV analysis, an analyzed page or one
+crawled site) as metric cards, charts, the word cloud and the same insights as
+the app. Charts are drawn with matplotlib's Figure API (no pyplot state, so
+worker processes need no display) and, like the word clouds in terms.py,
+cached on disk as PNG images keyed by what they show, so a batch of reports
+for many stores draws each distinct chart once. A report is a few pages, so
+reportlab builds the whole document in memory; it is saved to a temporary file
+that is renamed into place, so a reader never sees a partial PDF. `cli.py
+report` runs batches of reports in worker processes.
+"""
+import functools
+import hashlib
+import json
+import os
+import re
+import time
+
+from profiling import stage
+from runtime import cache_dir
+
+# Chart size on the page in points, and the resolution of its cached image
+CHART_SIZE = (440, 170)
+CHART_DPI = 150
+WORDCLOUD_WIDTH = 320
+# A4 width less the margins set in write_report
+FRAME_WIDTH = 495
+# Cached chart images and app downloads kept on disk; the oldest are removed beyond these
+MAX_CHARTS = 2000
+MAX_REPORTS = 200
+# Pages listed in a site report
+MAX_PAGES = 50
+# Bump when the layout changes, so cached charts and reports are drawn again
+REPORT_VERSION = 1
+SENTIMENT_COLORS = ("#43A047", "#9E9E9E", "#E53935")
+ACCENT = "#E64A19"
+
+
+# "csv", "site" (one site of a crawl) or "page"
+def result_kind(result):
+    if "error" in result and "sentiment" not in result:
+        raise ValueError(result["error"])
+    if "site" in result:
+        return "site"
+    if "url" in result and "term_counts" in result:
+        return "page"
+    if "reviews" in result and "sentiment" in result:
+        return "csv"
+    raise ValueError("Not a website or feedback analysis result")
+
+
+def source_of(result):
+    return result.get("file") or result.get("site") or result.get("url") or ""
+
+
+# File names for a batch of reports: the feedback file's name or the site's
+# host, made unique with a counter
+def report_names(results):
+    seen = {}
+    names = []
+    for result in results:
+        if result.get("file"):
+            base = os.path.splitext(os.path.basename(result["file"]))[0]
+        else:
+            base = re.sub(r"^[a-z]+://", "", source_of(result).rstrip("/"))
+        base = re.sub(r"[^\w.-]+", "-", base).strip("-.") or "report"
+        seen[base] = seen.get(base, 0) + 1
+        names.append(f"{base}.pdf" if seen[base] == 1 else f"{base}-{seen[base]}.pdf")
+    return names
+
+
+def _prune(folder, keep):
+    files = [os.path.join(folder, name) for name in os.listdir(folder) if not name.endswith(".tmp")]
+    if len(files) > keep:
+        files.sort(key=os.path.getmtime)
+        for old in files[:len(files) - keep]:
+            try:
+                os.remove(old)
+            except FileNotFoundError:
+                pass
+
+
+def _figure():
+    from matplotlib.figure import Figure
+
+    width, height = CHART_SIZE
+    figure = Figure(figsize=(width / 72, height / 72), layout="constrained")
+    ax = figure.add_subplot()
+    for side in ("top", "right"):
+        ax.spines[side].set_visible(False)
+    return figure, ax
+
+
+# Horizontal bars, top to bottom; `bars` is a list of (label, value, color)
+def _bar_figure(bars, value_format):
+    figure, ax = _figure()
+    labels, values, colors = zip(*bars)
+    container = ax.barh(range(len(bars)), values, color=colors, height=0.6)
+    ax.set_yticks(range(len(bars)), labels, fontsize=9)
+    ax.invert_yaxis()
+    ax.bar_label(container, fmt=value_format, padding=3, fontsize=8)
+    ax.xaxis.set_visible(False)
+    ax.spines["bottom"].set_visible(False)
+    ax.set_xlim(0, max(max(values), 1) * 1.15)
+    return figure
+
+
+def _sentiment_figure(shares):
+    return _bar_figure(list(zip(("Positive", "Neutral", "Negative"), shares, SENTIMENT_COLORS)), "%.1f%%")
+
+
+def _terms_figure(counts):
+    return _bar_figure([(label, count, ACCENT) for label, count in counts], "%d")
+
+
+# Satisfaction per bucket, and its rolling average
+def _trend_figure(data):
+    figure, ax = _figure()
+    nan = float("nan")
+    x = range(len(data["labels"]))
+    ax.plot(x, [nan if v is None else v for v in data["satisfaction"]], color=ACCENT, marker=".",
+            label="Satisfaction")
+    ax.plot(x, [nan if v is None else v for v in data["rolling"]], color="#5D4037", linestyle="--",
+            label=f"{data['window']}-{data['bucket'].lower()} average")
+    # Label at most about a dozen buckets
+    step = max(1, len(data["labels"]) // 12)
+    ax.set_xticks(list(x)[::step], data["labels"][::step], fontsize=7, rotation=30 if len(x) > 8 else 0)
+    ax.set_ylim(0, 100)
+    ax.tick_params(axis="y", labelsize=8)
+    ax.legend(fontsize=7, frameon=False, loc="upper left", ncols=2)
+    return figure
+
+
+CHARTS = {"sentiment": _sentiment_figure, "terms": _terms_figure, "trend": _trend_figure}
+
+
+# PNG of a chart, cached on disk by its kind and data; identical charts in
+# other reports, earlier batches or other processes reuse the image
+def chart_png(kind, data):
+    payload = json.dumps([kind, data, CHART_SIZE, CHART_DPI, REPORT_VERSION], sort_keys=True).encode("utf-8")
+    folder = os.path.join(cache_dir(), "charts")
+    path = os.path.join(folder, f"{hashlib.blake2b(payload, digest_size=16).hexdigest()}.png")
+    if os.path.exists(path):
+        return path
+
+    os.makedirs(folder, exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    CHARTS[kind](data).savefig(tmp, format="png", dpi=CHART_DPI)
+    os.replace(tmp, path)
+    _prune(folder, MAX_CHARTS)
+    return path
+
+
+# Percentages rounded to what the report prints, so near-identical results share an image
+def _sentiment_chart(sentiment):
+    return chart_png("sentiment", [round(sentiment[field] * 100, 1) for field in ("pos", "neu", "neg")])
+
+
+# Monthly buckets for long files, weekly or daily ones for short spans; None without dated reviews
+def _trend_chart(trend):
+    from trends import TrendAggregates, bucketed
+
+    aggregates = TrendAggregates.from_dict(trend)
+    if aggregates.days.empty:
+        return None
+    days = (aggregates.days.index.max() - aggregates.days.index.min()).days
+    bucket = "Month" if days > 120 else "Week" if days > 28 else "Day"
+    window = 3 if bucket == "Month" else 4
+    table = bucketed(aggregates, bucket, window)
+    fmt = "%b %Y" if bucket == "Month" else "%d %b"
+
+    def values(column):
+        return [None if value != value else round(float(value), 1) for value in table[column]]
+
+    return chart_png("trend", {
+        "labels": [d.strftime(fmt) for d in table.index],
+        "satisfaction": values("satisfaction"),
+        "rolling": values("satisfaction_rolling"),
+        "bucket": bucket,
+        "window": window,
+    })
+
+
+@functools.lru_cache(maxsize=None)
+def _styles():
+    from reportlab.lib import colors
+    from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+
+    styles = getSampleStyleSheet()
+    styles.add(ParagraphStyle("Value", parent=styles["Normal"], fontName="Helvetica-Bold", fontSize=18,
+                              leading=22, alignment=1, textColor=colors.HexColor(ACCENT)))
+    styles.add(ParagraphStyle("Label", parent=styles["Normal"], fontSize=8, alignment=1,
+                              textColor=colors.HexColor("#5D4037")))
+    styles.add(ParagraphStyle("Note", parent=styles["Normal"], fontSize=8, textColor=colors.grey))
+    return styles
+
+
+def _escape(text):
+    return str(text).replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+
+
+# A row of metric cards; `cards` is a list of (value, label)
+def _cards(cards):
+    from reportlab.lib import colors
+    from reportlab.platypus import Paragraph, Table, TableStyle
+
+    styles = _styles()
+    table = Table([[Paragraph(_escape(value), styles["Value"]) for value, _ in cards],
+                   [Paragraph(_escape(label), styles["Label"]) for _, label in cards]],
+                  colWidths=[FRAME_WIDTH / len(cards)] * len(cards))
+    table.setStyle(TableStyle([
+        ("BOX", (0, 0), (-1, -1), 0.5, colors.HexColor("#D7CCC8")),
+        ("INNERGRID", (0, 0), (-1, -1), 0.25, colors.HexColor("#EFEBE9")),
+        ("BACKGROUND", (0, 0), (-1, -1), colors.HexColor("#FFF8F0")),
+        ("TOPPADDING", (0, 0), (-1, -1), 6),
+        ("BOTTOMPADDING", (0, 0), (-1, -1), 6),
+    ]))
+    return table
+
+
+def _image(path, width):
+    from reportlab.lib.utils import ImageReader
+    from reportlab.platypus import Image
+
+    pixels_wide, pixels_high = ImageReader(path).getSize()
+    return Image(path, width=width, height=width * pixels_high / pixels_wide)
+
+
+def _score_text(score, good, fair, poor):
+    return good if score >= 70 else fair if score >= 40 else poor
+
+
+def _header(title, source):
+    from reportlab.platypus import Paragraph
+
+    styles = _styles()
+    return [
+        Paragraph(_escape(title), styles["Title"]),
+        Paragraph(f"{_escape(source)} · generated {time.strftime('%d %b %Y %H:%M')}", styles["Note"]),
+    ]
+
+
+def _csv_story(result):
+    from reportlab.platypus import Paragraph, Spacer
+
+    from terms import wordcloud_png
+
+    styles = _styles()
+    sentiment = result["sentiment"]
+    satisfaction = sentiment["satisfaction"]
+    story = _header("Customer Feedback Report", f"{result['file']} · column '{result['column']}'")
+    story.append(Spacer(0, 10))
+
+    cards = [(f"{result['rows']:,}", "Rows"), (f"{result['reviews']:,}", "Reviews Analyzed"),
+             (f"{result['words']:,}", "Words Analyzed"), (f"{satisfaction}/100", "Satisfaction Score"),
+             (f"{sentiment['positive_reviews']:,}", "Positive Reviews")]
+    duplicates = result.get("duplicates")
+    if duplicates:
+        cards.append((f"{duplicates['exact'] + duplicates['near']:,}", "Duplicates Skipped"))
+    estimate = result.get("estimate")
+    if estimate and not estimate["exact"]:
+        margin = estimate["margins"]["pos"]
+        cards[3] = (f"{sentiment['pos'] * 100:.1f}" + ("" if margin is None else f" ± {margin * 100:.1f}"),
+                    "Satisfaction Score")
+        cards[4] = (f"{estimate['positive_share'] * 100:.1f}%", "Positive-Review Rate")
+    story.append(_cards(cards))
+    notes = [f"{result['missing']:,} missing reviews."]
+    if estimate and not estimate["exact"]:
+        notes.append(f"Estimated from {estimate['sampled']:,} of {estimate['population']:,} reviews picked at "
+                     f"random; ± gives the {estimate['confidence']:.0%} confidence interval for the whole file.")
+    if duplicates:
+        notes.append(f"Left out {duplicates['exact']:,} exact and {duplicates['near']:,} near duplicates "
+                     f"(similarity ≥ {duplicates['threshold']:.2f}).")
+    story.append(Paragraph(" ".join(notes), styles["Note"]))
+
+    story.append(Paragraph("Sentiment", styles["Heading2"]))
+    story.append(_image(_sentiment_chart(sentiment), CHART_SIZE[0]))
+    trend = result.get("trend")
+    chart = _trend_chart(trend) if trend else None
+    if chart:
+        story.append(Paragraph(f"Sentiment Trend ({_escape(trend['date_column'])})", styles["Heading2"]))
+        story.append(_image(chart, CHART_SIZE[0]))
+    if result["frequencies"]:
+        story.append(Paragraph("Word Cloud", styles["Heading2"]))
+        story.append(_image(wordcloud_png(result["frequencies"]), WORDCLOUD_WIDTH))
+
+    story.append(Paragraph("Insights", styles["Heading2"]))
+    story.append(Paragraph(_score_text(
+        satisfaction, "Customers are very satisfied with your bakery!",
+        "Moderate customer satisfaction. Some areas need improvement.",
+        "Low customer satisfaction. Immediate attention needed."), styles["Normal"]))
+    if result.get("benchmark"):
+        story.append(Paragraph(_escape(result["benchmark"]), styles["Normal"]))
+    return story
+
+
+# An analyzed page, or one crawled site with its pages listed
+def _website_story(result):
+    from reportlab.lib import colors
+    from reportlab.platypus import Paragraph, Spacer, Table, TableStyle
+
+    styles = _styles()
+    term_counts = result["term_counts"]
+    health_score = result["health_score"]
+    site = "site" in result
+    story = _header("Website Content Report", result["site"] if site else result["url"])
+    story.append(Spacer(0, 10))
+    cards = [(f"{result['words']:,}", "Words Analyzed"), (f"{sum(term_counts.values()):,}", "Bakery Terms"),
+             (f"{health_score}/100", "Content Score")]
+    if site:
+        cards.insert(0, (f"{result['pages']:,}", "Pages"))
+    story.append(_cards(cards))
+    if site and result["errors"]:
+        story.append(Paragraph(f"{result['errors']:,} pages could not be analyzed.", styles["Note"]))
+
+    story.append(Paragraph("Sentiment", styles["Heading2"]))
+    story.append(_image(_sentiment_chart(result["sentiment"]), CHART_SIZE[0]))
+    story.append(Paragraph("Content Analysis", styles["Heading2"]))
+    if term_counts:
+        counts = sorted(term_counts.items(), key=lambda item: (-item[1], item[0]))
+        story.append(_image(chart_png("terms", counts), CHART_SIZE[0]))
+    else:
+        story.append(Paragraph("Limited bakery content detected.", styles["Normal"]))
+
+    story.append(Paragraph("Recommendations", styles["Heading2"]))
+    story.append(Paragraph(_score_text(
+        health_score, "Your website has excellent bakery content. Keep up the good work!",
+        "Good content. Consider adding more product details and customer testimonials.",
+        "Your website needs more bakery-specific content. Add product descriptions, about section, and "
+        "customer reviews."), styles["Normal"]))
+
+    if site and result["page_results"]:
+        pages = result["page_results"]
+        story.append(Paragraph("Pages", styles["Heading2"]))
+        rows = [["URL", "Depth", "Words", "Content Score"]] + [
+            [Paragraph(_escape(p["url"]), styles["Note"]), p["depth"], f"{p.get('words', 0):,}",
+             p.get("error", "")[:40] or p.get("health_score", "")]
+            for p in pages[:MAX_PAGES]]
+        table = Table(rows, colWidths=[FRAME_WIDTH - 190, 40, 60, 90], repeatRows=1)
+        table.setStyle(TableStyle([
+            ("FONTSIZE", (0, 0), (-1, -1), 8),
+            ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
+            ("LINEBELOW", (0, 0), (-1, 0), 0.5, colors.grey),
+            ("VALIGN", (0, 0), (-1, -1), "TOP"),
+        ]))
+        story.append(table)
+        if len(pages) > MAX_PAGES:
+            story.append(Paragraph(f"First {MAX_PAGES} of {len(pages)} pages shown.", styles["Note"]))
+    return story
+
+
+STORIES = {"csv": _csv_story, "site": _website_story, "page": _website_story}
+
+
+# Write the PDF report of one analysis result to `path`
+def write_report(result, path):
+    from reportlab.lib.pagesizes import A4
+    from reportlab.platypus import SimpleDocTemplate
+
+    kind = result_kind(result)
+    with stage("report", 1, "reports"):
+        tmp = f"{path}.{os.getpid()}.tmp"
+        doc = SimpleDocTemplate(tmp, pagesize=A4, title=f"Bakery Analyzer: {source_of(result)}",
+                                author="Bakery Analyzer", leftMargin=50, rightMargin=50, topMargin=40,
+                                bottomMargin=40)
+        try:
+            doc.build(STORIES[kind](result))
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        os.replace(tmp, path)
+    return path
+
+
+# Report of a result for the app's download button, cached on disk by the
+# result's content so reruns and other sessions reuse the file
+def report_file(result):
+    payload = json.dumps([result, REPORT_VERSION], sort_keys=True, default=str).encode("utf-8")
+    folder = os.path.join(cache_dir(), "reports")
+    path = os.path.join(folder, f"{hashlib.blake2b(payload, digest_size=16).hexdigest()}.pdf")
+    if not os.path.exists(path):
+        os.makedirs(folder, exist_ok=True)
+        write_report(result, path)
+        _prune(folder, MAX_REPORTS)
+    return path
@@ -0,0 +1,47 @@
+"""Process-wide setup shared by every Streamlit session and worker process."""
+import functools
+import os
+
+VADER_LEXICON = "sentiment/vader_lexicon.zip"
+
+
+# Look for the VADER lexicon in the local nltk_data paths (never calls the downloader)
+def lexicon_available():
+    from nltk.data import find
+
+    try:
+        find(VADER_LEXICON)
+    except LookupError:
+        return False
+    return True
+
+
+# Build the sentiment analyzer once per process; later calls reuse it. It is
+# the VADER kernel from vader_kernel.py: nltk's scores at a fraction of the cost.
+@functools.lru_cache(maxsize=None)
+def get_analyzer():
+    if not lexicon_available():
+        raise LookupError(
+            "VADER lexicon not found. Install it once with: python -m nltk.downloader vader_lexicon"
+        )
+    from vader_kernel import VaderKernel
+
+    return VaderKernel()
+
+
+# Directory for on-disk caches; override with BAKERY_ANALYZER_CACHE_DIR
+def cache_dir():
+    path = os.environ.get("BAKERY_ANALYZER_CACHE_DIR") or os.path.join(
+        os.path.expanduser("~"), ".cache", "bakery-analyzer"
+    )
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+# Directory for data that must survive cache clears; override with BAKERY_ANALYZER_DATA_DIR
+def data_dir():
+    path = os.environ.get("BAKERY_ANALYZER_DATA_DIR") or os.path.join(
+        os.path.expanduser("~"), ".local", "share", "bakery-analyzer"
+    )
+    os.makedirs(path, exist_ok=True)
+    return path
@@ -0,0 +1,92 @@
+"""On-disk cache of per-review sentiment scores, so re-uploads only score new rows."""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+from runtime import cache_dir
+
+# About 60 bytes per cached review on disk
+MAX_ENTRIES = 2_000_000
+# SQLite caps the number of bound parameters per statement
+BATCH = 500
+
+
+# Key a review by its text with whitespace normalised. Case is kept on purpose:
+# VADER scores "GREAT" higher than "great".
+def review_key(text):
+    return hashlib.blake2b(" ".join(text.split()).encode("utf-8"), digest_size=16).digest()
+
+
+# Hit counters for one analysis
+class CacheStats:
+    def __init__(self):
+        self.hits = 0
+        self.lookups = 0
+
+    @property
+    def hit_rate(self):
+        return self.hits / self.lookups if self.lookups else 0.0
+
+
+# SQLite-backed score store with least-recently-used eviction past max_entries
+class ScoreCache:
+    def __init__(self, path=None, max_entries=MAX_ENTRIES):
+        self.path = path or os.path.join(cache_dir(), "scores.sqlite")
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        # Batch workers may share the file, so wait for their writes instead of failing
+        self._db = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS scores ("
+            "key BLOB PRIMARY KEY, neg REAL, neu REAL, pos REAL, compound REAL, used INTEGER"
+            ") WITHOUT ROWID"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS scores_used ON scores(used)")
+        self._db.commit()
+
+    # Cached (neg, neu, pos, compound) for the keys that are present
+    def get_many(self, keys):
+        found = {}
+        now = int(time.time())
+        with self._lock:
+            for i in range(0, len(keys), BATCH):
+                batch = keys[i:i + BATCH]
+                marks = ",".join("?" * len(batch))
+                rows = self._db.execute(
+                    f"SELECT key, neg, neu, pos, compound FROM scores WHERE key IN ({marks})", batch
+                ).fetchall()
+                for key, *scores in rows:
+                    found[key] = scores
+                if rows:
+                    self._db.execute(
+                        f"UPDATE scores SET used = ? WHERE key IN ({marks})", [now, *batch]
+                    )
+            self._db.commit()
+        return found
+
+    def put_many(self, keys, scores):
+        now = int(time.time())
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO scores VALUES (?, ?, ?, ?, ?, ?)",
+                ((key, *map(float, row), now) for key, row in zip(keys, scores)),
+            )
+            self._evict()
+            self._db.commit()
+
+    def _evict(self):
+        (count,) = self._db.execute("SELECT count(*) FROM scores").fetchone()
+        excess = count - self.max_entries
+        if excess > 0:
+            self._db.execute(
+                "DELETE FROM scores WHERE key IN (SELECT key FROM scores ORDER BY used LIMIT ?)",
+                (excess,),
+            )
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute("SELECT count(*) FROM scores").fetchone()[0]
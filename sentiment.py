@@ -0,0 +1,133 @@
+"""Batch sentiment scoring: every review is scored exactly once."""
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+
+from profiling import stage
+from runtime import get_analyzer
+
+# Columns of the per-review score array returned by score_reviews
+NEG, NEU, POS, COMPOUND = range(4)
+SCORE_FIELDS = ("neg", "neu", "pos", "compound")
+
+# A review counts as positive when VADER puts more than half of it in "pos"
+POSITIVE_THRESHOLD = 0.5
+CHUNK_SIZE = 20000
+# Below this many reviews, shipping chunks to other processes costs more than it
+# saves: the VADER kernel scores about 50k reviews/s per core, and sending texts
+# and scores between processes adds roughly a tenth of that per review
+MIN_PARALLEL = 100000
+
+
+# Cores this process may run on (fewer than os.cpu_count() in most containers)
+def default_workers():
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0)) or 1
+    return os.cpu_count() or 1
+
+
+# Worker processes live for the whole server process, so each loads the lexicon once
+_pools = {}
+
+
+def _pool(workers):
+    if workers not in _pools:
+        _pools[workers] = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+    return _pools[workers]
+
+
+# Stop the scoring workers. A process that is itself a multiprocessing child
+# must call this before it exits: its exit joins child processes without
+# shutting their pools down first, and would wait on them forever.
+def shutdown_pools():
+    while _pools:
+        _pools.popitem()[1].shutdown(cancel_futures=True)
+
+
+def _score_chunk(texts):
+    return get_analyzer().score_many(texts)
+
+
+def _score(texts, workers, chunk_size):
+    if not texts:
+        return np.empty((0, 4), dtype=np.float32)
+
+    workers = workers or default_workers()
+    with stage("sentiment", len(texts), "reviews"):
+        if workers == 1 or len(texts) < MIN_PARALLEL:
+            return _score_chunk(texts)
+
+        chunks = [texts[i:i + chunk_size] for i in range(0, len(texts), chunk_size)]
+        try:
+            return np.concatenate(list(_pool(workers).map(_score_chunk, chunks)))
+        except BrokenProcessPool:
+            # A worker died (killed for memory, say); the next call starts a fresh pool
+            _pools.pop(workers).shutdown(wait=False, cancel_futures=True)
+            return _score_chunk(texts)
+
+
+# Score each review once; returns an (n, 4) float32 array of neg/neu/pos/compound.
+# With a ScoreCache, cached reviews are reused and only the misses are scored.
+def score_reviews(texts, workers=None, chunk_size=CHUNK_SIZE, cache=None, stats=None):
+    texts = [str(t) for t in texts]
+    if cache is None:
+        return _score(texts, workers, chunk_size)
+
+    from score_cache import review_key
+
+    keys = [review_key(t) for t in texts]
+    # Identical reviews in one upload are looked up and scored once
+    first = {}
+    for i, key in enumerate(keys):
+        first.setdefault(key, i)
+    with stage("score_cache", len(first), "reviews"):
+        found = cache.get_many(list(first))
+
+    missing = [key for key in first if key not in found]
+    computed = _score([texts[first[key]] for key in missing], workers, chunk_size)
+    if missing:
+        with stage("score_cache", len(missing), "reviews"):
+            cache.put_many(missing, computed)
+
+    by_key = dict(found)
+    by_key.update(zip(missing, computed))
+    out = np.array([by_key[key] for key in keys], dtype=np.float32).reshape(len(keys), 4)
+
+    if stats is not None:
+        stats.lookups += len(keys)
+        stats.hits += sum(1 for key in keys if key in found)
+    return out
+
+
+# Running totals so chunked ingestion can report the same metrics as summarize()
+class SentimentTotals:
+    def __init__(self):
+        self.reviews = 0
+        self.sums = np.zeros(4, dtype=np.float64)
+        self.positive = 0
+
+    def add(self, scores):
+        self.reviews += len(scores)
+        self.sums += scores.sum(axis=0, dtype=np.float64)
+        self.positive += int((scores[:, POS] > POSITIVE_THRESHOLD).sum())
+        return self
+
+    def summary(self):
+        means = self.sums / self.reviews if self.reviews else self.sums
+        return {
+            "reviews": self.reviews,
+            "neg": float(means[NEG]),
+            "neu": float(means[NEU]),
+            "pos": float(means[POS]),
+            "compound": float(means[COMPOUND]),
+            "satisfaction": int(means[POS] * 100),
+            "positive_reviews": self.positive,
+        }
+
+
+# Headline metrics for the CSV tab, all derived from the per-review array
+def summarize(scores):
+    return SentimentTotals().add(scores).summary()
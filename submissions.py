@@ -0,0 +1,100 @@
+"""Persistent store for "Upload Data" submissions and the header counters."""
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from runtime import data_dir
+
+
+class SubmissionStore:
+    def __init__(self, path=None):
+        self.path = path or os.path.join(data_dir(), "submissions.sqlite")
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS submissions (
+                id INTEGER PRIMARY KEY,
+                created REAL NOT NULL,
+                bakery_name TEXT NOT NULL,
+                location TEXT NOT NULL,
+                bakery_type TEXT NOT NULL,
+                years_operation INTEGER,
+                products TEXT NOT NULL,
+                product_count INTEGER NOT NULL,
+                rating INTEGER NOT NULL,
+                common_feedback TEXT,
+                challenges TEXT,
+                success_factors TEXT
+            );
+            CREATE INDEX IF NOT EXISTS submissions_type ON submissions(bakery_type);
+            CREATE INDEX IF NOT EXISTS submissions_location ON submissions(location);
+            CREATE INDEX IF NOT EXISTS submissions_rating ON submissions(rating);
+            -- Running totals, maintained in the same transaction as the inserts
+            CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value REAL NOT NULL);
+            """
+        )
+        self._db.commit()
+
+    def _bump(self, increments):
+        self._db.executemany(
+            "INSERT INTO counters (name, value) VALUES (?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+            increments.items(),
+        )
+
+    # Insert many submissions in one transaction; returns how many were stored
+    def add_many(self, submissions):
+        now = time.time()
+        rows = [(
+            now,
+            s["bakery_name"].strip(),
+            s["bakery_location"].strip(),
+            s["bakery_type"],
+            int(s.get("years_operation") or 0),
+            s["products"],
+            len(s["products"].split(",")),
+            int(s["rating"]),
+            s.get("common_feedback", ""),
+            json.dumps(s.get("challenges", [])),
+            json.dumps(s.get("success_factors", [])),
+        ) for s in submissions]
+        if not rows:
+            return 0
+
+        with self._lock, self._db:
+            self._db.executemany(
+                "INSERT INTO submissions (created, bakery_name, location, bakery_type, years_operation, "
+                "products, product_count, rating, common_feedback, challenges, success_factors) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._bump({
+                "bakeries": len(rows),
+                "rating_sum": sum(row[7] for row in rows),
+                "products": sum(row[6] for row in rows),
+            })
+        return len(rows)
+
+    def add(self, submission):
+        return self.add_many([submission])
+
+    def record_reviews(self, count):
+        with self._lock, self._db:
+            self._bump({"reviews_analyzed": count})
+
+    # Header card values, read from the counters table (no scan of submissions)
+    def header_metrics(self):
+        with self._lock:
+            values = dict(self._db.execute("SELECT name, value FROM counters").fetchall())
+        bakeries = int(values.get("bakeries", 0))
+        return {
+            "total_bakeries": bakeries,
+            "avg_rating": round(values.get("rating_sum", 0) / bakeries, 1) if bakeries else "–",
+            "reviews_analyzed": int(values.get("reviews_analyzed", 0)),
+            "products_tracked": int(values.get("products", 0)),
+        }
@@ -0,0 +1,249 @@
+"""Inverted index from review words to reviews, for drill-down by product or term.
+
+Built during CSV ingestion from the same words as the word cloud. Each word
+maps to a sorted int32 array of review ids (the review's position in the
+analyzed column), stored CSR-style: one postings array plus per-word offsets.
+Review texts, file row numbers and sentiment scores sit next to the postings,
+so a query touches only the arrays it needs. Everything is memory-mapped on
+load, and AND/OR queries are sorted-array intersections and unions.
+"""
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from profiling import stage
+from sentiment import COMPOUND, summarize
+from terms import text_words
+
+# Matching reviews returned for display
+SAMPLE_REVIEWS = 100
+
+
+def _intersect(a, b):
+    if len(a) > len(b):
+        a, b = b, a
+    if not len(a):
+        return a
+    at = np.searchsorted(b, a).clip(max=len(b) - 1)
+    return a[b[at] == a]
+
+
+# Values per block when copying spill files into the final arrays
+BLOCK = 1 << 20
+
+
+def _read_block(path, dtype, start, count):
+    return np.fromfile(path, dtype=dtype, count=count, offset=start * np.dtype(dtype).itemsize)
+
+
+# Copy a raw spill file into a .npy array block by block, then remove it
+def _raw_to_npy(raw, path, dtype, shape):
+    if not np.prod(shape):
+        np.save(path, np.empty(shape, dtype=dtype))
+    else:
+        out = np.lib.format.open_memmap(path, mode="w+", dtype=dtype, shape=shape)
+        flat = out.reshape(-1)
+        for start in range(0, len(flat), BLOCK):
+            block = _read_block(raw, dtype, start, BLOCK)
+            flat[start:start + len(block)] = block
+        out.flush()
+        del out, flat
+    os.remove(raw)
+
+
+# Collects postings chunk by chunk; save() writes the index directory. Each
+# chunk's postings, scores, rows and text lengths are appended to spill files
+# as they arrive, so memory stays bounded by the chunk size however long the
+# file is; only the vocabulary is kept in memory.
+class TermIndexBuilder:
+    def __init__(self, path):
+        self.path = path
+        self.tmp = f"{path}.{os.getpid()}.tmp"
+        shutil.rmtree(self.tmp, ignore_errors=True)
+        os.makedirs(self.tmp)
+        self.vocab = {}
+        self.reviews = 0
+        self.postings = 0
+        # Posting count at the start of each chunk's run; a run is sorted by word, then review
+        self._runs = [0]
+        self._files = {name: open(os.path.join(self.tmp, f"{name}.bin"), "wb")
+                       for name in ("texts", "codes", "ids", "lengths", "rows", "scores")}
+
+    def _spill(self, name):
+        return os.path.join(self.tmp, f"{name}.bin")
+
+    # `reviews` and their (n, 4) scores, plus review_words(reviews)
+    def add(self, reviews, scores, words):
+        with stage("index", len(reviews), "reviews"):
+            local, uniques = pd.factorize(words.to_numpy())
+            codes = np.fromiter((self.vocab.setdefault(w, len(self.vocab)) for w in uniques),
+                                dtype=np.int32, count=len(uniques))[local]
+            ids = reviews.index.get_indexer(words.index).astype(np.int32) + self.reviews
+            order = np.lexsort((ids, codes))
+            codes, ids = codes[order], ids[order]
+            # A word repeated within one review is one posting
+            keep = np.ones(len(ids), dtype=bool)
+            keep[1:] = (codes[1:] != codes[:-1]) | (ids[1:] != ids[:-1])
+            codes[keep].tofile(self._files["codes"])
+            ids[keep].tofile(self._files["ids"])
+            self.postings += int(keep.sum())
+            self._runs.append(self.postings)
+
+            encoded = [text.encode("utf-8") for text in reviews]
+            self._files["texts"].write(b"".join(encoded))
+            np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded)).tofile(self._files["lengths"])
+            reviews.index.to_numpy(dtype=np.int64).tofile(self._files["rows"])
+            np.ascontiguousarray(scores, dtype=np.float32).tofile(self._files["scores"])
+            self.reviews += len(reviews)
+        return self
+
+    # Write the index and return {"path", "reviews", "terms"}
+    def save(self):
+        with stage("index", self.reviews, "reviews"):
+            for fh in self._files.values():
+                fh.close()
+            self._save_postings()
+            self._save_text_offsets()
+            _raw_to_npy(self._spill("rows"), os.path.join(self.tmp, "rows.npy"), np.int64, (self.reviews,))
+            _raw_to_npy(self._spill("scores"), os.path.join(self.tmp, "scores.npy"), np.float32, (self.reviews, 4))
+            with open(os.path.join(self.tmp, "terms.json"), "w", encoding="utf-8") as fh:
+                json.dump(list(self.vocab), fh)
+            shutil.rmtree(self.path, ignore_errors=True)
+            os.replace(self.tmp, self.path)
+        return {"path": self.path, "reviews": self.reviews, "terms": len(self.vocab)}
+
+    def _runs_of(self, name):
+        for start, stop in zip(self._runs[:-1], self._runs[1:]):
+            yield _read_block(self._spill(name), np.int32, start, stop - start)
+
+    # Merge the sorted runs into CSR postings: count each word's postings, then
+    # place every run's ids after those of earlier runs. Runs are in review
+    # order, so each word's ids come out sorted.
+    def _save_postings(self):
+        counts = np.zeros(len(self.vocab), dtype=np.int64)
+        for codes in self._runs_of("codes"):
+            counts += np.bincount(codes, minlength=len(self.vocab))
+        offsets = np.zeros(len(self.vocab) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        np.save(os.path.join(self.tmp, "offsets.npy"), offsets)
+
+        path = os.path.join(self.tmp, "postings.npy")
+        if not self.postings:
+            np.save(path, np.empty(0, dtype=np.int32))
+        else:
+            postings = np.lib.format.open_memmap(path, mode="w+", dtype=np.int32, shape=(self.postings,))
+            cursor = offsets[:-1].copy()
+            for codes, ids in zip(self._runs_of("codes"), self._runs_of("ids")):
+                words, first, sizes = np.unique(codes, return_index=True, return_counts=True)
+                rank = np.arange(len(codes)) - np.repeat(first, sizes)
+                postings[cursor[codes] + rank] = ids
+                cursor[words] += sizes
+            postings.flush()
+            del postings
+        os.remove(self._spill("codes"))
+        os.remove(self._spill("ids"))
+
+    def _save_text_offsets(self):
+        raw, path = self._spill("lengths"), os.path.join(self.tmp, "text_offsets.npy")
+        out = np.lib.format.open_memmap(path, mode="w+", dtype=np.int64, shape=(self.reviews + 1,))
+        out[0] = total = 0
+        for start in range(0, self.reviews, BLOCK):
+            block = np.cumsum(_read_block(raw, np.int64, start, BLOCK)) + total
+            out[start + 1:start + 1 + len(block)] = block
+            total = int(block[-1])
+        out.flush()
+        del out
+        os.remove(raw)
+
+    def discard(self):
+        for fh in self._files.values():
+            fh.close()
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+
+class TermIndex:
+    def __init__(self, path):
+        self.path = path
+        self.postings = self._load("postings")
+        self.offsets = self._load("offsets")
+        self.text_offsets = self._load("text_offsets")
+        self.rows = self._load("rows")
+        self.scores = self._load("scores")
+        self.texts = np.memmap(os.path.join(path, "texts.bin"), dtype=np.uint8, mode="r") \
+            if self.text_offsets[-1] else np.empty(0, np.uint8)
+        with open(os.path.join(path, "terms.json"), encoding="utf-8") as fh:
+            self.terms = {term: i for i, term in enumerate(json.load(fh))}
+        self.reviews = len(self.rows)
+
+    def _load(self, name):
+        return np.load(os.path.join(self.path, f"{name}.npy"), mmap_mode="r")
+
+    # Sorted ids of the reviews containing one indexed word
+    def word(self, word):
+        i = self.terms.get(word)
+        if i is None:
+            return np.empty(0, dtype=np.int32)
+        return self.postings[self.offsets[i]:self.offsets[i + 1]]
+
+    # Reviews mentioning `term` in any of its spellings (plurals, and lexicon
+    # synonyms for lexicon terms). A multi-word spelling matches reviews that
+    # contain all of its words.
+    def term(self, term):
+        from keywords import get_matcher
+
+        matches = []
+        for phrase in get_matcher().spellings(term):
+            words = text_words(" ".join(phrase))
+            if words:
+                ids = self.word(words[0])
+                for word in words[1:]:
+                    ids = _intersect(ids, self.word(word))
+                matches.append(ids)
+        return self._union(matches)
+
+    def _union(self, arrays):
+        arrays = [a for a in arrays if len(a)]
+        if len(arrays) <= 1:
+            return np.asarray(arrays[0]) if arrays else np.empty(0, dtype=np.int32)
+        found = np.zeros(self.reviews, dtype=bool)
+        for ids in arrays:
+            found[ids] = True
+        return np.flatnonzero(found).astype(np.int32)
+
+    # Sorted ids of reviews that mention all (`match_all`) or any of `terms`
+    def query(self, terms, match_all=True):
+        with stage("index_query", len(terms), "terms"):
+            matches = [self.term(term) for term in terms]
+            if not matches:
+                return np.empty(0, dtype=np.int32)
+            if not match_all:
+                return self._union(matches)
+            matches.sort(key=len)
+            ids = matches[0]
+            for other in matches[1:]:
+                ids = _intersect(ids, other)
+            return np.asarray(ids)
+
+    # Same metrics as a whole-file analysis, for the given reviews
+    def summary(self, ids):
+        return summarize(np.asarray(self.scores[ids]))
+
+    def text(self, i):
+        return bytes(self.texts[self.text_offsets[i]:self.text_offsets[i + 1]]).decode("utf-8")
+
+    # Up to `limit` of the given reviews, most negative first
+    def sample(self, ids, limit=SAMPLE_REVIEWS):
+        compound = self.scores[ids, COMPOUND]
+        picked = ids[np.argsort(compound, kind="stable")[:limit]]
+        return [{"row": int(self.rows[i]), "review": self.text(i), "compound": float(self.scores[i, COMPOUND])}
+                for i in picked]
+
+    # The `n` words found in the most reviews
+    def top_words(self, n=200):
+        counts = np.diff(self.offsets)
+        top = np.argsort(-counts, kind="stable")[:n]
+        words = list(self.terms)
+        return [words[i] for i in top]
@@ -0,0 +1,115 @@
+"""Word frequencies for the feedback word cloud, and the cached cloud image."""
+import functools
+import hashlib
+import json
+import os
+import re
+from collections import Counter
+
+from profiling import stage
+from runtime import cache_dir
+
+# Same tokenisation as WordCloud.process_text, so the cloud looks the same
+WORD_PATTERN = r"\w[\w']*"
+# Vocabulary kept between chunks; rarer words are pruned once it doubles
+MAX_TERMS = 50000
+WORDCLOUD_SIZE = (400, 300)
+# Cached word cloud images kept on disk; the oldest are removed beyond this
+MAX_WORDCLOUDS = 500
+
+
+@functools.lru_cache(maxsize=None)
+def _stopwords():
+    from wordcloud import STOPWORDS
+
+    return frozenset(w.lower() for w in STOPWORDS)
+
+
+# Lowercased words of a Series of review strings, one row per word under the
+# review's index label; stopwords and numbers are left out
+def review_words(texts):
+    with stage("tokenize", len(texts), "reviews"):
+        words = texts.str.lower().str.findall(WORD_PATTERN).explode().dropna()
+        words = words.str.replace(r"'s$", "", regex=True)
+        return words[~words.isin(_stopwords()) & ~words.str.isdigit() & (words != "")]
+
+
+# review_words for one short string, such as a search term
+def text_words(text):
+    words = (re.sub(r"'s$", "", word) for word in re.findall(WORD_PATTERN, text.lower()))
+    return [word for word in words if word and word not in _stopwords() and not word.isdigit()]
+
+
+# Whether review_words keeps every word of `text`, so the words it is indexed
+# under can find it; a phrase with a stopword in it cannot be matched as typed
+def indexable(text):
+    words = re.findall(WORD_PATTERN, text.lower())
+    return bool(words) and len(text_words(text)) == len(words)
+
+
+# Vectorised word counts for a Series of review strings
+def count_terms(texts):
+    return review_words(texts).value_counts()
+
+
+# Incrementally merged word counts with a bounded vocabulary
+class TermCounter:
+    def __init__(self, max_terms=MAX_TERMS):
+        self.max_terms = max_terms
+        self.counts = Counter()
+
+    # `words` is review_words(texts), when the caller already has it
+    def update(self, texts, words=None):
+        with stage("word_counts", len(texts), "reviews"):
+            words = review_words(texts) if words is None else words
+            self.counts.update(words.value_counts().to_dict())
+            if len(self.counts) > 2 * self.max_terms:
+                self.counts = Counter(dict(self.counts.most_common(self.max_terms)))
+        return self
+
+    def most_common(self, n=200):
+        return dict(self.counts.most_common(n))
+
+
+# Identifies a frequency table regardless of dict order
+def frequency_hash(frequencies):
+    payload = json.dumps(sorted(frequencies.items()), separators=(",", ":")).encode("utf-8")
+    return hashlib.blake2b(payload, digest_size=16).hexdigest()
+
+
+# PNG word cloud for a frequency table. Images are cached on disk by table hash,
+# so the same table is laid out once and never goes through a matplotlib figure.
+def wordcloud_png(frequencies, size=WORDCLOUD_SIZE):
+    with stage("wordcloud", len(frequencies), "terms"):
+        return _wordcloud_png(frequencies, size)
+
+
+def _wordcloud_png(frequencies, size):
+    width, height = size
+    folder = os.path.join(cache_dir(), "wordclouds")
+    path = os.path.join(folder, f"{frequency_hash(frequencies)}-{width}x{height}.png")
+    if os.path.exists(path):
+        return path
+
+    from wordcloud import WordCloud
+
+    os.makedirs(folder, exist_ok=True)
+    # A fixed layout seed makes the cached image match a fresh render
+    image = WordCloud(width=width, height=height, background_color="white",
+                      random_state=0).generate_from_frequencies(frequencies).to_image()
+    tmp = f"{path}.{os.getpid()}.tmp"
+    image.save(tmp, format="PNG")
+    os.replace(tmp, path)
+    _prune(folder)
+    return path
+
+
+def _prune(folder):
+    files = [os.path.join(folder, name) for name in os.listdir(folder) if name.endswith(".png")]
+    if len(files) > MAX_WORDCLOUDS:
+        files.sort(key=os.path.getmtime)
+        for old in files[:len(files) - MAX_WORDCLOUDS]:
+            try:
+                os.remove(old)
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,188 @@
+"""Sentiment over time for feedback files with a date column.
+
+Reviews are aggregated into per-day sums (count, neg/neu/pos/compound, positive
+reviews). Weeks, months and rolling averages are resampled from those sums.
+Day sums are kept per file in a TrendStore, so when a file comes back with
+new rows appended, only the new rows are bucketed.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from profiling import stage
+from runtime import cache_dir
+from sentiment import POSITIVE_THRESHOLD, SCORE_FIELDS
+
+DATE_KEYWORDS = ("date", "time", "created", "posted", "day")
+# Share of sampled values that must parse for a column to count as dates
+MIN_PARSED = 0.8
+FIELDS = ("reviews", *SCORE_FIELDS, "positive")
+# Pandas offsets for the trend buckets; weeks start on Monday
+BUCKETS = {"Day": "D", "Week": "W-MON", "Month": "MS"}
+MAX_SNAPSHOTS = 200
+READ_BYTES = 1024 * 1024
+
+
+def parse_dates(values):
+    with warnings.catch_warnings():
+        # Mixed formats fall back to per-value parsing; that is expected here
+        warnings.simplefilter("ignore", UserWarning)
+        parsed = pd.to_datetime(values, errors="coerce", utc=True)
+    return parsed.dt.tz_localize(None)
+
+
+# Columns of a sample frame that hold dates or timestamps
+def find_date_columns(frame):
+    found = []
+    for col in frame.columns:
+        values = frame[col].dropna()
+        if pd.api.types.is_datetime64_any_dtype(values):
+            found.append(col)
+        elif not values.empty and (pd.api.types.is_string_dtype(values) or values.dtype == object):
+            named = any(keyword in str(col).lower() for keyword in DATE_KEYWORDS)
+            parsed = parse_dates(values.astype(str))
+            if parsed.notna().mean() >= (0.5 if named else MIN_PARSED):
+                found.append(col)
+    return found
+
+
+# Per-day sentiment sums, merged chunk by chunk
+class TrendAggregates:
+    def __init__(self, days=None, undated=0):
+        self.days = days if days is not None else pd.DataFrame(columns=FIELDS, dtype=np.float64)
+        self.undated = undated
+
+    # Add one chunk: `dates` aligned with the rows of the (n, 4) score array
+    def add(self, dates, scores):
+        with stage("trend", len(dates), "reviews"):
+            days = parse_dates(dates).dt.normalize().to_numpy()
+            dated = ~pd.isna(days)
+            self.undated += int((~dated).sum())
+            if not dated.any():
+                return self
+
+            frame = pd.DataFrame(scores[dated].astype(np.float64), columns=list(SCORE_FIELDS), index=days[dated])
+            frame.insert(0, "reviews", 1.0)
+            frame["positive"] = (frame["pos"] > POSITIVE_THRESHOLD).astype(np.float64)
+            sums = frame.groupby(level=0).sum()
+            # Only the days present in this chunk change
+            self.days = sums if self.days.empty else self.days.add(sums, fill_value=0)
+        return self
+
+    def to_dict(self):
+        days = self.days.sort_index()
+        return {
+            "date": [d.strftime("%Y-%m-%d") for d in days.index],
+            **{field: days[field].tolist() for field in FIELDS},
+            "undated": self.undated,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        days = pd.DataFrame({field: data[field] for field in FIELDS},
+                            index=pd.to_datetime(data["date"]), dtype=np.float64)
+        return cls(days, data["undated"])
+
+
+# Trend table for one bucket size: reviews, mean sentiment and rolling means
+# over the last `window` buckets (weighted by review count)
+def bucketed(trend, bucket="Week", window=4):
+    days = trend.days.sort_index()
+    if days.empty:
+        return pd.DataFrame()
+    sums = days.resample(BUCKETS[bucket], label="left", closed="left").sum()
+    rolled = sums.rolling(window, min_periods=1).sum()
+    reviews = sums["reviews"].replace(0, np.nan)
+    rolled_reviews = rolled["reviews"].replace(0, np.nan)
+    return pd.DataFrame({
+        "reviews": sums["reviews"].astype(int),
+        "satisfaction": sums["pos"] / reviews * 100,
+        "compound": sums["compound"] / reviews,
+        "positive_share": sums["positive"] / reviews,
+        "satisfaction_rolling": rolled["pos"] / rolled_reviews * 100,
+        "compound_rolling": rolled["compound"] / rolled_reviews,
+    })
+
+
+# Day sums of analyzed files, keyed by a hash of the file's bytes
+class TrendStore:
+    def __init__(self, path=None, max_snapshots=MAX_SNAPSHOTS):
+        self.path = path or os.path.join(cache_dir(), "trends.sqlite")
+        self.max_snapshots = max_snapshots
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS snapshots ("
+            "hash TEXT, size INTEGER, columns TEXT, rows INTEGER, trend TEXT, used REAL, "
+            "PRIMARY KEY (hash, columns))"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS snapshots_columns ON snapshots(columns, size)")
+        self._db.commit()
+
+    # One pass over the file: the largest stored snapshot whose file is a
+    # prefix of this one (same bytes, then appended rows), and this file's key.
+    # Returns (rows, TrendAggregates) or None, and the key to save under.
+    # `variant` keeps snapshots made with different review filtering apart.
+    def find(self, source, column, date_column, variant=""):
+        columns = f"{column}\x1f{date_column}" + (f"\x1f{variant}" if variant else "")
+        with self._lock:
+            candidates = self._db.execute(
+                "SELECT hash, size, rows FROM snapshots WHERE columns = ? ORDER BY size", (columns,)
+            ).fetchall()
+
+        hasher = hashlib.blake2b(digest_size=16)
+        offset, best, last = 0, None, b""
+        pending = iter(candidates)
+        candidate = next(pending, None)
+        source.seek(0)
+        while True:
+            block = source.read(READ_BYTES)
+            if not block:
+                break
+            last = block[-1:]
+            # Check every candidate boundary that falls inside this block
+            while candidate is not None and candidate[1] <= offset + len(block):
+                cut = candidate[1] - offset
+                hasher.update(block[:cut])
+                offset, block = offset + cut, block[cut:]
+                if hasher.hexdigest() == candidate[0]:
+                    best = candidate
+                candidate = next(pending, None)
+            hasher.update(block)
+            offset += len(block)
+        source.seek(0)
+
+        key = None
+        # Appended rows can only start cleanly after a final newline
+        if last == b"\n":
+            key = (hasher.hexdigest(), offset, columns)
+        if best is None:
+            return None, key
+        with self._lock, self._db:
+            (data,) = self._db.execute("SELECT trend FROM snapshots WHERE hash = ? AND columns = ?",
+                                       (best[0], columns)).fetchone()
+            self._db.execute("UPDATE snapshots SET used = ? WHERE hash = ? AND columns = ?",
+                             (time.time(), best[0], columns))
+        return (best[2], TrendAggregates.from_dict(json.loads(data))), key
+
+    def save(self, key, rows, trend):
+        if key is None:
+            return
+        file_hash, size, columns = key
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO snapshots VALUES (?, ?, ?, ?, ?, ?)",
+                (file_hash, size, columns, rows, json.dumps(trend.to_dict()), time.time()),
+            )
+            self._db.execute(
+                "DELETE FROM snapshots WHERE rowid IN (SELECT rowid FROM snapshots ORDER BY used DESC "
+                "LIMIT -1 OFFSET ?)", (self.max_snapshots,),
+            )
@@ -0,0 +1,108 @@
+"""Parsed feedback uploads shared by every session of the server process.
+
+Streamlit reruns the script on every interaction. Entries are keyed by a hash
+of the file's content, so reruns, other sessions and re-uploads of the same
+file reuse the file metrics and column metadata instead of reading the file
+again. Only the review columns are read in full, chunk by chunk, to count
+rows and missing reviews; no frame is kept, since the analysis itself runs
+in a job process. The rest of the file is only sampled to find date columns.
+The least recently used entries are evicted once their samples together pass
+a memory budget.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+
+from ingest import find_text_columns, read_chunks, read_preview
+
+MAX_BYTES = 64 * 1024 * 1024
+# Rows used to detect date columns
+SAMPLE_ROWS = 100
+READ_BYTES = 1024 * 1024
+MAX_UPLOAD_IDS = 1000
+
+
+def content_hash(upload):
+    hasher = hashlib.blake2b(digest_size=16)
+    upload.seek(0)
+    for block in iter(lambda: upload.read(READ_BYTES), b""):
+        hasher.update(block)
+    upload.seek(0)
+    return hasher.hexdigest()
+
+
+# One upload's parsed data. The file metrics are None when only the first rows
+# were read (streaming mode). `missing` counts empty reviews.
+class ParsedUpload:
+    def __init__(self, key, sample, rows=None, missing=None):
+        from trends import find_date_columns
+
+        self.key = key
+        self.sample = sample
+        self.columns = list(sample.columns)
+        self.text_columns = find_text_columns(self.columns)
+        self.date_columns = find_date_columns(sample.drop(columns=self.text_columns))
+        self.rows = rows
+        self.missing = missing
+        self.nbytes = int(sample.memory_usage(deep=True).sum())
+
+    # Whether the file metrics are known, or cannot be (no review columns)
+    @property
+    def complete(self):
+        return self.rows is not None or not self.text_columns
+
+
+class UploadCache:
+    def __init__(self, max_bytes=MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        # Upload id -> content hash, so a rerun does not hash the file again
+        self._hashes = OrderedDict()
+
+    def key(self, upload):
+        file_id = getattr(upload, "file_id", None)
+        with self._lock:
+            known = self._hashes.get(file_id) if file_id else None
+        if known is None:
+            known = content_hash(upload)
+            if file_id:
+                with self._lock:
+                    self._hashes[file_id] = known
+                    if len(self._hashes) > MAX_UPLOAD_IDS:
+                        self._hashes.popitem(last=False)
+        return known
+
+    # Parsed data for an upload; `full` counts the whole file, otherwise the
+    # first rows are enough
+    def get(self, upload, full=True):
+        key = self.key(upload)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (entry.complete or not full):
+                self._entries.move_to_end(key)
+                return entry
+
+        sample = read_preview(upload, rows=SAMPLE_ROWS)
+        rows = missing = None
+        text_columns = find_text_columns(sample.columns)
+        if full and text_columns:
+            rows = missing = 0
+            for chunk in read_chunks(upload, text_columns, text_columns=text_columns):
+                rows += len(chunk)
+                missing += int(chunk.isnull().sum().sum())
+        entry = ParsedUpload(key, sample, rows, missing)
+        upload.seek(0)
+        self._store(entry)
+        return entry
+
+    def _store(self, entry):
+        if entry.nbytes > self.max_bytes:
+            return
+        with self._lock:
+            self._entries[entry.key] = entry
+            self._entries.move_to_end(entry.key)
+            total = sum(e.nbytes for e in self._entries.values())
+            while total > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                total -= evicted.nbytes
@@ -0,0 +1,263 @@
+"""VADER sentiment scoring with the per-review overhead taken out.
+
+Gives the same scores as nltk's SentimentIntensityAnalyzer, from the same
+vader_lexicon, with the same rules: boosters and dampeners, ALL CAPS emphasis,
+negation, "never so", "least", "but", idioms and punctuation emphasis. What
+changes is the work per review. Each distinct raw token is resolved once per
+process into a tuple of everything the rules ask about it (punctuation-stripped
+form, lower case, caps, lexicon valence, booster scalar, negation), so a review
+costs one split and one dict lookup per token. Reviews without sentiment words
+never reach the rules, and nltk's per-call punctuation product table is gone.
+
+nltk's quirks are kept on purpose, so cached scores stay valid: a repeated
+token is scored at its first position, and the idiom and "never" checks
+compare tokens case-sensitively. benchmarks/bench_vader.py checks the kernel
+against nltk on a golden corpus.
+"""
+import math
+import string
+
+import numpy as np
+from nltk.sentiment.vader import VaderConstants
+
+LEXICON_FILE = "sentiment/vader_lexicon.zip/vader_lexicon/vader_lexicon.txt"
+# Distinct raw tokens remembered per process; the table starts over beyond this
+MAX_TOKENS = 200_000
+
+B_INCR = VaderConstants.B_INCR
+B_DECR = VaderConstants.B_DECR
+C_INCR = VaderConstants.C_INCR
+N_SCALAR = VaderConstants.N_SCALAR
+BOOSTERS = VaderConstants.BOOSTER_DICT
+NEGATE = VaderConstants.NEGATE
+IDIOMS = VaderConstants.SPECIAL_CASE_IDIOMS
+PUNCTUATION = frozenset(string.punctuation)
+PUNC_SET = frozenset(VaderConstants.PUNC_LIST)
+# Every word of a multi-word idiom or booster; no idiom matches without one of them
+IDIOM_WORDS = frozenset(
+    word for phrase in (*IDIOMS, *BOOSTERS) if " " in phrase for word in phrase.split()
+)
+SO_THIS = ("so", "this")
+
+# Fields of a compiled token
+WORD, LOWER, UPPER, VALENCE, BOOST, NEGATED = range(6)
+
+
+def load_lexicon(lexicon_file=LEXICON_FILE):
+    import nltk.data
+
+    lexicon = {}
+    for line in nltk.data.load(lexicon_file).split("\n"):
+        word, measure = line.strip().split("\t")[0:2]
+        lexicon[word] = float(measure)
+    return lexicon
+
+
+# The form nltk's SentiText gives a raw token: one leading or trailing
+# punctuation mark from its PUNC_LIST is dropped when what remains is a word
+# of two or more characters with no punctuation in it
+def strip_token(raw):
+    start, end = 0, len(raw)
+    while start < end and raw[start] in PUNCTUATION:
+        start += 1
+    while end > start and raw[end - 1] in PUNCTUATION:
+        end -= 1
+    core = raw[start:end]
+    if len(core) < 2 or (start and end < len(raw)) or not (start or end < len(raw)):
+        return raw
+    if any(c in PUNCTUATION for c in core):
+        return raw
+    return core if (raw[:start] or raw[end:]) in PUNC_SET else raw
+
+
+class VaderKernel:
+    def __init__(self, lexicon=None, max_tokens=MAX_TOKENS):
+        self.lexicon = lexicon if lexicon is not None else load_lexicon()
+        self.max_tokens = max_tokens
+        self._tokens = {}
+
+    def _compile(self, raw):
+        if len(raw) < 2:
+            token = None
+        else:
+            word = strip_token(raw)
+            lower = word.lower()
+            token = (word, lower, word.isupper(), self.lexicon.get(lower), BOOSTERS.get(lower),
+                     lower in NEGATE or "n't" in lower)
+        if len(self._tokens) >= self.max_tokens:
+            self._tokens.clear()
+        self._tokens[raw] = token
+        return token
+
+    def tokens(self, text):
+        table = self._tokens
+        out = []
+        for raw in text.split():
+            token = table.get(raw, False)
+            if token is False:
+                token = self._compile(raw)
+            if token is not None:
+                out.append(token)
+        return out
+
+    # The four scores (neg, neu, pos, compound) of one text, rounded like nltk's
+    def scores(self, text):
+        tokens = self.tokens(text)
+        if not tokens:
+            return 0.0, 0.0, 0.0, 0.0
+        if all(t[VALENCE] is None for t in tokens):
+            # No sentiment words: every token is neutral
+            return 0.0, 1.0, 0.0, 0.0
+        sentiments = self._sentiments(tokens)
+        return self._score_valence(sentiments, text)
+
+    def polarity_scores(self, text):
+        neg, neu, pos, compound = self.scores(text)
+        return {"neg": neg, "neu": neu, "pos": pos, "compound": compound}
+
+    # (n, 4) float32 array of neg/neu/pos/compound, one row per text
+    def score_many(self, texts):
+        scores = self.scores
+        flat = np.fromiter((value for text in texts for value in scores(text)),
+                           dtype=np.float32, count=4 * len(texts))
+        return flat.reshape(len(texts), 4)
+
+    def _sentiments(self, tokens):
+        n = len(tokens)
+        caps = sum(1 for t in tokens if t[UPPER])
+        cap_diff = 0 < n - caps < n
+        words = [t[WORD] for t in tokens]
+        first = {}
+        sentiments = []
+        but = -1
+        for j, token in enumerate(tokens):
+            word = token[WORD]
+            i = first.setdefault(word, j)
+            lower = token[LOWER]
+            if but < 0 and lower == "but":
+                but = j
+            if i != j:
+                # nltk scores a repeated token at its first position
+                sentiments.append(sentiments[i])
+            elif token[BOOST] is not None or (
+                lower == "kind" and i < n - 1 and tokens[i + 1][LOWER] == "of"
+            ):
+                sentiments.append(0)
+            elif token[VALENCE] is None:
+                sentiments.append(0)
+            else:
+                sentiments.append(self._valence(tokens, words, i, cap_diff))
+
+        if but >= 0:
+            for k in range(n):
+                if k < but:
+                    sentiments[k] = sentiments[k] * 0.5
+                elif k > but:
+                    sentiments[k] = sentiments[k] * 1.5
+        return sentiments
+
+    # Valence of the sentiment word at position i (nltk's sentiment_valence)
+    def _valence(self, tokens, words, i, cap_diff):
+        token = tokens[i]
+        valence = token[VALENCE]
+        if token[UPPER] and cap_diff:
+            valence = valence + C_INCR if valence > 0 else valence - C_INCR
+
+        for start_i in range(3):
+            if i <= start_i:
+                break
+            prev = tokens[i - start_i - 1]
+            if prev[VALENCE] is not None:
+                continue
+            s = 0.0
+            if prev[BOOST] is not None:
+                s = prev[BOOST]
+                if valence < 0:
+                    s *= -1
+                if prev[UPPER] and cap_diff:
+                    s = s + C_INCR if valence > 0 else s - C_INCR
+                if start_i == 1 and s != 0:
+                    s = s * 0.95
+                if start_i == 2 and s != 0:
+                    s = s * 0.9
+            valence = valence + s
+
+            if start_i == 0:
+                if prev[NEGATED]:
+                    valence = valence * N_SCALAR
+            elif start_i == 1:
+                if words[i - 2] == "never" and words[i - 1] in SO_THIS:
+                    valence = valence * 1.5
+                elif prev[NEGATED]:
+                    valence = valence * N_SCALAR
+            else:
+                if (words[i - 3] == "never" and words[i - 2] in SO_THIS) or words[i - 1] in SO_THIS:
+                    valence = valence * 1.25
+                elif prev[NEGATED]:
+                    valence = valence * N_SCALAR
+                if any(w in IDIOM_WORDS for w in words[i - 3:i + 3]):
+                    valence = self._idioms(valence, words, i)
+
+        if i > 0:
+            prev = tokens[i - 1]
+            if prev[VALENCE] is None and prev[LOWER] == "least":
+                if i == 1 or tokens[i - 2][LOWER] not in ("at", "very"):
+                    valence = valence * N_SCALAR
+        return valence
+
+    @staticmethod
+    def _idioms(valence, words, i):
+        onezero = f"{words[i - 1]} {words[i]}"
+        twoonezero = f"{words[i - 2]} {words[i - 1]} {words[i]}"
+        twoone = f"{words[i - 2]} {words[i - 1]}"
+        threetwoone = f"{words[i - 3]} {words[i - 2]} {words[i - 1]}"
+        threetwo = f"{words[i - 3]} {words[i - 2]}"
+        for seq in (onezero, twoonezero, twoone, threetwoone, threetwo):
+            if seq in IDIOMS:
+                valence = IDIOMS[seq]
+                break
+        if len(words) - 1 > i:
+            zeroone = f"{words[i]} {words[i + 1]}"
+            if zeroone in IDIOMS:
+                valence = IDIOMS[zeroone]
+        if len(words) - 1 > i + 1:
+            zeroonetwo = f"{words[i]} {words[i + 1]} {words[i + 2]}"
+            if zeroonetwo in IDIOMS:
+                valence = IDIOMS[zeroonetwo]
+        if threetwo in BOOSTERS or twoone in BOOSTERS:
+            valence = valence + B_DECR
+        return valence
+
+    @staticmethod
+    def _score_valence(sentiments, text):
+        sum_s = float(sum(sentiments))
+        ep = min(text.count("!"), 4) * 0.292
+        qm_count = text.count("?")
+        qm = 0
+        if qm_count > 1:
+            qm = qm_count * 0.18 if qm_count <= 3 else 0.96
+        amplifier = ep + qm
+        if sum_s > 0:
+            sum_s += amplifier
+        elif sum_s < 0:
+            sum_s -= amplifier
+        compound = sum_s / math.sqrt((sum_s * sum_s) + 15)
+
+        pos_sum = 0.0
+        neg_sum = 0.0
+        neu_count = 0
+        for s in sentiments:
+            if s > 0:
+                pos_sum += float(s) + 1
+            elif s < 0:
+                neg_sum += float(s) - 1
+            else:
+                neu_count += 1
+        if pos_sum > math.fabs(neg_sum):
+            pos_sum += amplifier
+        elif pos_sum < math.fabs(neg_sum):
+            neg_sum -= amplifier
+
+        total = pos_sum + math.fabs(neg_sum) + neu_count
+        return (round(math.fabs(neg_sum / total), 3), round(math.fabs(neu_count / total), 3),
+                round(math.fabs(pos_sum / total), 3), round(compound, 4))
@@ -0,0 +1,130 @@
+"""Fetching bakery web pages and scoring their content."""
+import hashlib
+from collections import namedtuple
+
+from html_text import decode_html, extract_visible_text
+from keywords import get_matcher
+from profiling import stage
+from runtime import get_analyzer
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
+TIMEOUT = 10
+# Pages are cut off after this many bytes; inline assets beyond it are never downloaded
+MAX_BYTES = 2 * 1024 * 1024
+CHUNK_BYTES = 64 * 1024
+# Bump when extraction or scoring changes, so cached page analyses are recomputed
+ANALYSIS_VERSION = 2
+# A missing Content-Type is allowed; anything else must be one of these
+TEXT_TYPES = ("text/html", "application/xhtml+xml", "text/plain")
+
+# A fetched page; source is "network", "cache" (fresh copy) or "revalidated" (304)
+Page = namedtuple("Page", "url content content_type content_hash source")
+
+
+def content_hash(content):
+    return hashlib.blake2b(content, digest_size=16).hexdigest()
+
+
+# Stream the response body, stopping at max_bytes
+def read_body(response, max_bytes=MAX_BYTES):
+    chunks, size = [], 0
+    try:
+        for chunk in response.iter_content(CHUNK_BYTES):
+            chunks.append(chunk)
+            size += len(chunk)
+            if size >= max_bytes:
+                break
+    finally:
+        response.close()
+    return b"".join(chunks)[:max_bytes]
+
+
+# GET a page; returns the response and its body, read up to max_bytes
+def fetch(url, session=None, timeout=TIMEOUT, headers=None, max_bytes=MAX_BYTES):
+    import requests
+
+    response = (session or requests).get(
+        url, timeout=timeout, stream=True, headers={"User-Agent": USER_AGENT, **(headers or {})}
+    )
+    try:
+        response.raise_for_status()
+        content_type = response.headers.get("Content-Type", "").split(";")[0].strip().lower()
+        if content_type and content_type not in TEXT_TYPES:
+            raise ValueError(f"Not a web page (Content-Type: {content_type})")
+    except Exception:
+        response.close()
+        raise
+    return response, read_body(response, max_bytes)
+
+
+# Fetch a page, through the HTTP cache when one is given
+def fetch_page(url, session=None, cache=None):
+    with stage("fetch") as timed:
+        if cache is not None:
+            page = cache.fetch(url, session)
+        else:
+            response, body = fetch(url, session)
+            page = Page(response.url, body, response.headers.get("Content-Type", ""), content_hash(body), "network")
+        timed.size = len(page.content)
+    return page
+
+
+# Visible text of a page and the raw href of every link on it
+def extract_text(html, content_type=""):
+    with stage("parse", len(html)):
+        try:
+            return extract_visible_text(decode_html(html, content_type))
+        except Exception:
+            # The streaming parser is lenient, but fall back to a full DOM if it ever gives up
+            return _extract_text_soup(html)
+
+
+def _extract_text_soup(html):
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, "html.parser")
+    hrefs = [a["href"] for a in soup.find_all("a", href=True)]
+
+    # Remove unnecessary elements
+    for element in soup(["script", "style", "meta", "link"]):
+        element.decompose()
+
+    return soup.get_text(separator=" ", strip=True), hrefs
+
+
+# Bakery keyword hits per lexicon category (see keywords.py)
+def count_terms(text):
+    with stage("keywords", len(text), "chars"):
+        return get_matcher().count(text)
+
+
+# Keyword and sentiment metrics for the text of one page
+def analyze_text(text):
+    with stage("sentiment", len(text), "chars"):
+        sentiment = get_analyzer().polarity_scores(text)
+    return {
+        "words": len(text.split()),
+        "term_counts": count_terms(text),
+        "sentiment": sentiment,
+        "health_score": int(sentiment["pos"] * 100),
+    }
+
+
+# Analysis and link hrefs for a page; an unchanged body reuses the cached analysis
+def analyze_page(page, cache=None):
+    key = f"{page.content_hash}-{ANALYSIS_VERSION}.{get_matcher().version}"
+    if cache is not None:
+        cached = cache.get_analysis(key)
+        if cached is not None:
+            return cached["result"], cached["hrefs"]
+
+    text, hrefs = extract_text(page.content, page.content_type)
+    result = analyze_text(text)
+    if cache is not None:
+        cache.put_analysis(key, {"result": result, "hrefs": hrefs})
+    return result, hrefs
+
+
+def analyze_url(url, session=None, cache=None):
+    result, _ = analyze_page(fetch_page(url, session, cache), cache)
+    return result